@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'exec_demo.settings')
 
 application = get_asgi_application()
+
+# Imported once the application has set up Django
+from main.tools.exec_api import asyncExecApi  # noqa: E402
+
+asyncExecApi.sharedLoop = True
@@ -31,11 +31,18 @@ def getJson(value):
     return value
 
 
-def getConfig(config):
+_NO_DEFAULT = object()
+
+
+def getConfig(config, default=_NO_DEFAULT):
+    if default is not _NO_DEFAULT and config not in config_json["configs"]:
+        return default
     return getJson(config_json["configs"][config])
 
 
-def getSecret(secret):
+def getSecret(secret, default=_NO_DEFAULT):
+    if default is not _NO_DEFAULT and secret not in config_json["secrets"]:
+        return default
     return getJson(config_json["secrets"][secret])
 
 
@@ -53,6 +60,133 @@ ALLOWED_HOSTS = getConfig('hosts')
 EXEC_API_URL = getConfig('exec-api')
 EXEC_API_TOKEN = getSecret('exec-api-token')
 
+# Connection pool of the exec client, see main/tools/exec_api.py
+EXEC_API_TIMEOUT = getConfig('exec-api-timeout', 10.0)  # seconds
+EXEC_API_CONNECT_TIMEOUT = getConfig('exec-api-connect-timeout', 3.0)  # seconds
+EXEC_API_MAX_CONNECTIONS = getConfig('exec-api-max-connections', 100)
+EXEC_API_MAX_KEEPALIVE_CONNECTIONS = getConfig('exec-api-max-keepalive-connections', 20)
+EXEC_API_KEEPALIVE_EXPIRY = getConfig('exec-api-keepalive-expiry', 30.0)  # seconds
+# Negotiated over TLS, so an http:// exec stays on HTTP/1.1
+EXEC_API_HTTP2 = getConfig('exec-api-http2', True)
+
+# Resilience: per-endpoint timeouts override EXEC_API_TIMEOUT, status and artifact calls are retried,
+# and after a run of failures calls to exec fail right away for a while instead of piling up
+EXEC_API_TIMEOUTS = {
+    'submit': 10.0,
+    'run': 10.0,
+    'compileStatus': 3.0,
+    'runStatus': 3.0,
+    'compileStatuses': 5.0,
+    'runStatuses': 5.0,
+    'downloadArtifact': 10.0,
+    **getConfig('exec-api-timeouts', {}),
+}  # seconds
+EXEC_API_RETRIES = getConfig('exec-api-retries', 2)
+EXEC_API_RETRY_DELAY = getConfig('exec-api-retry-delay', 0.1)  # seconds, doubles with every retry
+EXEC_API_RETRY_CAP = getConfig('exec-api-retry-cap', 1.0)  # seconds
+EXEC_CIRCUIT_FAILURE_THRESHOLD = getConfig('exec-circuit-failure-threshold', 5)  # consecutive failures
+EXEC_CIRCUIT_RESET_TIMEOUT = getConfig('exec-circuit-reset-timeout', 10.0)  # seconds before a trial call
+# Pages wait this long for a fresh status, then show the last known one marked as stale
+EXEC_VIEW_STATUS_TIMEOUT = getConfig('exec-view-status-timeout', 1.0)  # seconds
+
+# Status polling in bulk, through the batch endpoints if exec has them or concurrent single requests otherwise
+EXEC_API_BATCH_STATUS = getConfig('exec-api-batch-status', True)
+EXEC_API_STATUS_BATCH_SIZE = getConfig('exec-api-status-batch-size', 50)
+EXEC_API_STATUS_CONCURRENCY = getConfig('exec-api-status-concurrency', 8)
+
+# Statuses fetched from exec are shared for a short while, so that viewers of a pending row coalesce into one request
+EXEC_STATUS_CACHE_ALIAS = 'default'
+EXEC_STATUS_CACHE_TTL = getConfig('exec-status-cache-ttl', 1.0)  # seconds, 0 disables
+EXEC_STATUS_CACHE_LOCK_TIMEOUT = getConfig('exec-status-cache-lock-timeout', EXEC_API_TIMEOUT)  # seconds
+
+# Artifacts are immutable, so they are cached locally: small ones in memory, the rest on disk.
+# A null directory disables the disk tier.
+EXEC_ARTIFACT_CACHE_DIR = getConfig('artifact-cache-dir', str(BASE_DIR / 'cache' / 'artifacts'))
+EXEC_ARTIFACT_CACHE_MEMORY_BYTES = getConfig('artifact-cache-memory-bytes', 32 << 20)
+EXEC_ARTIFACT_CACHE_DISK_BYTES = getConfig('artifact-cache-disk-bytes', 1 << 30)
+EXEC_ARTIFACT_CACHE_SMALL_BYTES = getConfig('artifact-cache-small-bytes', 64 << 10)  # largest blob kept in memory
+# Artifacts are kept gzipped at this level, with seek points so that previews and ranges don't inflate it all
+EXEC_ARTIFACT_COMPRESSION_LEVEL = getConfig('artifact-compression-level', 6)
+# Pages show this many bytes from the start and from the end of an artifact, the rest is behind a download link
+EXEC_ARTIFACT_PREVIEW_BYTES = getConfig('artifact-preview-bytes', 16 << 10)
+
+# Exec reports finished compilations and runs to the callback view, if it is given this url.
+# Callbacks are authenticated by EXEC_API_TOKEN, or by an HMAC-SHA256 signature of the body with the secret.
+EXEC_WEBHOOK_URL = getConfig('exec-webhook-url', None)
+EXEC_WEBHOOK_SECRET = getSecret('exec-webhook-secret', None)
+# With callbacks enabled, polling is only a fallback for lost ones
+EXEC_WEBHOOK_FALLBACK_POLL = getConfig('exec-webhook-fallback-poll', 30.0)  # seconds
+
+# Live status updates over server-sent events, see main/views_impl/events.py
+EXEC_EVENTS_INTERVAL = getConfig('exec-events-interval', 1.0)  # seconds between database checks
+EXEC_EVENTS_HEARTBEAT = getConfig('exec-events-heartbeat', 15.0)  # seconds
+EXEC_EVENTS_MAX_DURATION = getConfig('exec-events-max-duration', 300.0)  # seconds, the browser reconnects after
+# Streams need the ASGI server; beyond this many per process, and under WSGI, pages poll instead
+EXEC_EVENTS_MAX_STREAMS = getConfig('exec-events-max-streams', 200)
+EXEC_EVENTS_POLL_INTERVAL = getConfig('exec-events-poll-interval', 5.0)  # seconds
+
+# Submissions and runs are handed to exec by `manage.py exec_dispatcher` through a database queue
+EXEC_QUEUE_CONCURRENCY = getConfig('exec-queue-concurrency', 8)  # requests in flight per dispatcher
+EXEC_QUEUE_MAX_PENDING = getConfig('exec-queue-max-pending', 1000)  # new work is refused above this
+EXEC_QUEUE_MAX_ATTEMPTS = getConfig('exec-queue-max-attempts', 8)
+EXEC_QUEUE_RETRY_DELAY = getConfig('exec-queue-retry-delay', 1.0)  # seconds, doubles with every attempt
+EXEC_QUEUE_RETRY_CAP = getConfig('exec-queue-retry-cap', 60.0)  # seconds
+EXEC_QUEUE_LEASE = getConfig('exec-queue-lease', 60.0)  # seconds before a claimed job is considered abandoned
+EXEC_QUEUE_INTERVAL = getConfig('exec-queue-interval', 0.2)  # seconds to sleep when the queue is empty
+
+EXEC_SOURCE_MAX_BYTES = getConfig('exec-source-max-bytes', 64 << 10)
+
+# Importing many submissions at once from a zip or tar archive, or with `manage.py import_submissions`
+EXEC_IMPORT_MAX_ENTRIES = getConfig('exec-import-max-entries', 5000)  # files past this are not imported
+EXEC_IMPORT_CHUNK_SIZE = getConfig('exec-import-chunk-size', 200)  # sources held in memory and saved at once
+
+# A byte-identical resubmission reuses an earlier successful compilation instead of compiling again.
+# Change the key whenever exec's compiler or its flags change, so that old binaries stop matching.
+EXEC_COMPILER_KEY = getConfig('exec-compiler-key', '')
+# In seconds; 0 disables reuse, null reuses compilations of any age
+EXEC_COMPILE_REUSE_WINDOW = getConfig('exec-compile-reuse-window', 7 * 24 * 3600)
+
+# Opt-in: a run of a binary on an input that already ran successfully copies that result instead of executing.
+# Runs posted with `benchmark` always execute. Change the limits key whenever exec's run limits change.
+EXEC_RUN_MEMOIZE = getConfig('exec-run-memoize', False)
+EXEC_RUN_LIMITS_KEY = getConfig('exec-run-limits-key', '')
+EXEC_RUN_REUSE_WINDOW = getConfig('exec-run-reuse-window', 7 * 24 * 3600)  # seconds, null to keep forever
+
+# Running one submission against many inputs at once
+EXEC_RUN_BATCH_MAX_INPUTS = getConfig('exec-run-batch-max-inputs', 500)
+EXEC_RUN_MAX_INPUT_BYTES = getConfig('exec-run-max-input-bytes', 1 << 20)
+# All the inputs end up in the database within one transaction, so their total is bounded too
+EXEC_RUN_BATCH_MAX_BYTES = getConfig('exec-run-batch-max-bytes', 32 << 20)
+EXEC_RUN_BATCH_INSERT_BYTES = getConfig('exec-run-batch-insert-bytes', 4 << 20)
+DATA_UPLOAD_MAX_NUMBER_FILES = EXEC_RUN_BATCH_MAX_INPUTS
+
+# Status polling is done by `manage.py exec_poller`, not by the views
+EXEC_POLLING_SCHEDULE = getConfig('exec-polling-schedule', 'main.models_impl.polling.ExponentialBackoffSchedule')
+EXEC_POLLING_SCHEDULE_OPTIONS = getConfig('exec-polling-schedule-options', {})
+EXEC_POLLER_INTERVAL = getConfig('exec-poller-interval', 0.5)  # seconds between idle cycles
+EXEC_POLLER_BATCH_SIZE = getConfig('exec-poller-batch-size', 100)
+# Seconds a poller or a viewer owns the rows it is polling, should be well above the exec api timeout
+EXEC_POLLER_LEASE = getConfig('exec-poller-lease', 60.0)
+
+# Submissions and runs lists
+LIST_PAGE_SIZE = getConfig('list-page-size', 50)
+LIST_MAX_PAGE_SIZE = getConfig('list-max-page-size', 500)
+
+# Prometheus metrics at /metrics: scrapers send this token as a bearer token, without it only staff can see them
+METRICS_TOKEN = getSecret('metrics-token', None)
+
+# Requests sending `X-Profile: <token>` get a Server-Timing header with their exec, SQL and template time.
+# A share of all requests is profiled and logged too; with a directory, both are also dumped there as cProfile stats.
+PROFILING_TOKEN = getSecret('profiling-token', None)
+PROFILING_SAMPLE_RATE = getConfig('profiling-sample-rate', 0.0)
+PROFILING_DIR = getConfig('profiling-dir', None)
+
+# Logs of the app go to stderr, as 'text' or one 'json' object per line
+LOG_FORMAT = getConfig('log-format', 'text')
+LOG_LEVEL = getConfig('log-level', 'INFO')
+LOG_RATE_LIMIT_BURST = getConfig('log-rate-limit-burst', 10)  # records of one kind let through per interval
+LOG_RATE_LIMIT_INTERVAL = getConfig('log-rate-limit-interval', 60.0)  # seconds
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -66,6 +200,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,7 +214,8 @@ ROOT_URLCONF = 'exec_demo.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # The Django backend, timing renders for ProfilingMiddleware
+        'BACKEND': 'main.tools.profiling.ProfiledTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -105,6 +241,48 @@ DATABASES = {
     }
 }
 
+# Local memory by default; a shared backend (file, memcached, redis) also coalesces exec requests across processes
+CACHES = {
+    'default': getConfig('cache', {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }),
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'rate_limit': {
+            '()': 'main.tools.logs.RateLimitFilter',
+            'burst': LOG_RATE_LIMIT_BURST,
+            'interval': LOG_RATE_LIMIT_INTERVAL,
+        },
+    },
+    'formatters': {
+        'text': {
+            '()': 'main.tools.logs.TextFormatter',
+            'format': '%(asctime)s %(levelname)s %(name)s: %(message)s',
+        },
+        'json': {
+            '()': 'main.tools.logs.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'main': {
+            'class': 'logging.StreamHandler',
+            'formatter': LOG_FORMAT,
+            'filters': ['rate_limit'],
+        },
+    },
+    'loggers': {
+        'main': {
+            'handlers': ['main'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
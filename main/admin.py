@@ -1,9 +1,11 @@
 from django.contrib import admin
 
-from .models import Submission, CompilationResult, Run, RunResult
+from .models import Submission, CompilationResult, Run, RunBatch, RunResult, ExecJob
 
 # Register your models here.
 admin.site.register(Submission)
 admin.site.register(CompilationResult)
 admin.site.register(Run)
-admin.site.register(RunResult)
\ No newline at end of file
+admin.site.register(RunBatch)
+admin.site.register(RunResult)
+admin.site.register(ExecJob)
\ No newline at end of file
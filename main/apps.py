@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+def _instrumentConnection(sender, connection, **kwargs):
+    from main.tools.profiling import sqlSpan
+    if sqlSpan not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sqlSpan)
 
 
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        # Times queries of profiled requests, on every thread's connection
+        connection_created.connect(_instrumentConnection)
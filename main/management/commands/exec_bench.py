@@ -0,0 +1,257 @@
+import contextlib
+import logging
+import math
+import tempfile
+import threading
+import time
+
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_databases, teardown_databases
+from django.urls import resolve
+
+from main.models_impl import ExecJob, Run, Submission
+from main.tools import exec_api
+from main.tools.artifact_cache import artifactCache
+from main.tools.fake_exec import FakeExec
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values, p: float) -> float:
+    # Nearest rank
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+@contextlib.contextmanager
+def _immediateTransactions():
+    # SQLite fails at once, instead of waiting, when a transaction that has read tries to write while another
+    # one writes. Transactions that start as writers wait for each other instead.
+    wrapper = type(connections['default'])
+    original = wrapper._start_transaction_under_autocommit
+    wrapper._start_transaction_under_autocommit = lambda self: self.cursor().execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    finally:
+        wrapper._start_transaction_under_autocommit = original
+
+
+async def _drain(content):
+    async for _ in content:
+        pass
+
+
+class _Bench:
+    # Each pipeline runs on a thread of its own with its own client, while one more thread does the work of
+    # exec_dispatcher and exec_poller, so pipelines really are in flight at once
+
+    def __init__(self, user, interval: float, timeout: float):
+        self.user = user
+        self.interval = interval
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.requests = defaultdict(list)  # view -> [(seconds, queries)]
+        self.stages = defaultdict(list)  # stage -> [seconds]
+        self.errors = Counter()
+
+    @property
+    def client(self) -> Client:
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client(raise_request_exception=False)
+            client.force_login(self.user)
+        return client
+
+    def request(self, name: str, method: str, path: str, data=None, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            resp = getattr(self.client, method)(path, data or {}, **headers)
+            if resp.streaming:
+                content = resp.streaming_content
+                if hasattr(content, '__aiter__'):
+                    async_to_sync(_drain)(content)
+                else:
+                    for _ in content:
+                        pass
+            elapsed = time.perf_counter() - start
+        with self.lock:
+            self.requests[name].append((elapsed, len(queries)))
+            if resp.status_code >= 400:
+                self.errors[name] += 1
+        return resp
+
+    def fail(self, name: str):
+        with self.lock:
+            self.errors[name] += 1
+
+    def work(self, stop: threading.Event):
+        # One exec_dispatcher and one exec_poller, taking turns
+        try:
+            while not stop.is_set():
+                try:
+                    for job in ExecJob.claim(100):
+                        job.dispatch()
+                    Submission.tryUpdateAll()
+                    Run.tryUpdateAll()
+                except Exception as e:
+                    logger.warning("Worker cycle failed: %r", e)
+                    self.fail('worker')
+                stop.wait(self.interval)
+        finally:
+            connection.close()
+
+    def waitFor(self, model, pk: int) -> bool:
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if not model.objects.get(pk=pk).isPending():
+                return True
+            time.sleep(self.interval)
+        self.fail('timeout')
+        return False
+
+    def pipeline(self, i: int):
+        # Submit, wait for the compilation, run, wait, look at the results
+        try:
+            self._pipeline(i)
+        except Exception:
+            self.fail('pipeline')
+            raise
+        finally:
+            connection.close()
+
+    def _pipeline(self, i: int):
+        start = time.perf_counter()
+        source = f'// {i}\nint main() {{}}\n'.encode()  # distinct, so that no compilation is reused
+        self.request('submit', 'post', '/submissions', {'source': SimpleUploadedFile(f'{i}.cpp', source)})
+        subm = Submission.objects.get(sourceHash=Submission.hashSource(source))
+        self.request('submissions list', 'get', '/submissions')
+        if not self.waitFor(Submission, subm.pk):
+            return
+        compiled = time.perf_counter()
+
+        self.request('submission page', 'get', f'/submission/{subm.pk}')
+        resp = self.request('create run', 'post', f'/createRun/{subm.pk}')
+        if resp.status_code != 302:
+            return
+        runPk = resolve(resp['Location']).kwargs['id']
+        if not self.waitFor(Run, runPk):
+            return
+        ran = time.perf_counter()
+
+        self.request('run page', 'get', f'/run/{runPk}')
+        self.request('stdout download', 'get', f'/run/{runPk}/stdout', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.request('runs list', 'get', '/runs')
+        with self.lock:
+            self.stages['compile'].append(compiled - start)
+            self.stages['run'].append(ran - compiled)
+            self.stages['pipeline'].append(time.perf_counter() - start)
+
+    def run(self, pipelines: int, parallel: int):
+        stop = threading.Event()
+        worker = threading.Thread(target=self.work, args=(stop,))
+        worker.start()
+        try:
+            with ThreadPoolExecutor(max_workers=parallel) as pool:
+                for future in [pool.submit(self.pipeline, i) for i in range(pipelines)]:
+                    error = future.exception()
+                    if error is not None:
+                        logger.warning("Pipeline failed: %r", error)
+        finally:
+            stop.set()
+            worker.join()
+
+
+class Command(BaseCommand):
+    help = ("Measures latency and throughput of submit -> compile -> run -> artifacts through the real views "
+            "and exec api client, against a local fake exec, on a throwaway test database")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pipelines', type=int, default=50, help="Number of submit-to-artifact pipelines")
+        parser.add_argument('--parallel', type=int, default=10, help="Pipelines in flight at once")
+        parser.add_argument('--latency', type=float, default=0.005, help="Seconds the fake exec takes per request")
+        parser.add_argument('--failure-rate', type=float, default=0.0, help="Share of exec requests answered by 503")
+        parser.add_argument('--artifact-bytes', type=int, default=4096, help="Size of the outputs and logs")
+        parser.add_argument('--polls', type=int, default=2, help="Status polls until a job finishes")
+        parser.add_argument('--no-batch-status', action='store_true', help="Fake an exec without batch endpoints")
+        parser.add_argument('--no-compression', action='store_true', help="Fake an exec that never gzips artifacts")
+        parser.add_argument('--interval', type=float, default=0.05, help="Seconds between worker cycles")
+        parser.add_argument(
+            '--timeout', type=float, default=60.0, help="Seconds a pipeline waits for a compilation or a run",
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, pipelines, parallel, latency, failure_rate, artifact_bytes, polls, no_batch_status,
+               no_compression, interval, timeout, seed, **options):
+        fake = FakeExec(
+            latency=latency,
+            failureRate=failure_rate,
+            artifactBytes=artifact_bytes,
+            pollsUntilFinished=polls,
+            batchStatus=not no_batch_status,
+            compression=not no_compression,
+            seed=seed,
+        ).start()
+        apis = (exec_api.execApi, exec_api.asyncExecApi)
+        saved = [(api.url, api.token) for api in apis]
+        savedDirectory = artifactCache.directory
+        testSettings = connection.settings_dict['TEST']
+        savedTestName = testSettings['NAME']
+        with tempfile.TemporaryDirectory() as tmp, contextlib.ExitStack() as stack:
+            if connection.vendor == 'sqlite':
+                # Threads share an in-memory database through a shared cache, where a busy table fails at once;
+                # a file waits for locks instead
+                testSettings['NAME'] = str(Path(tmp) / 'bench.sqlite3')
+                stack.enter_context(_immediateTransactions())
+            databases = setup_databases(verbosity=0, interactive=False, aliases=['default'])
+            try:
+                with override_settings(EXEC_WEBHOOK_URL=None):
+                    for api in apis:
+                        api.url, api.token = fake.url, 'bench'
+                    exec_api.execApi.batchStatusSupported = True
+                    artifactCache.directory = Path(tmp) / 'artifacts'
+
+                    bench = _Bench(User.objects.create_user('bench', password='bench'), interval, timeout)
+                    start = time.perf_counter()
+                    bench.run(pipelines, parallel)
+                    elapsed = time.perf_counter() - start
+            finally:
+                teardown_databases(databases, verbosity=0)
+                testSettings['NAME'] = savedTestName
+                for api, (url, token) in zip(apis, saved):
+                    api.url, api.token = url, token
+                artifactCache.directory = savedDirectory
+                fake.stop()
+
+        self.report(bench, fake, pipelines, elapsed)
+
+    def report(self, bench: _Bench, fake: FakeExec, pipelines: int, elapsed: float):
+        out = self.stdout.write
+        out(f"{'request':<20}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}")
+        for name, samples in bench.requests.items():
+            seconds = [s for s, _ in samples]
+            queries = sum(q for _, q in samples) / len(samples)
+            out(f"{name:<20}{len(samples):>7}"
+                f"{percentile(seconds, 50) * 1000:>9.1f}{percentile(seconds, 95) * 1000:>9.1f}"
+                f"{percentile(seconds, 99) * 1000:>9.1f}{queries:>9.1f}{bench.errors[name]:>8}")
+        out('')
+        out(f"{'stage':<20}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for name, seconds in bench.stages.items():
+            out(f"{name:<20}{len(seconds):>7}"
+                f"{percentile(seconds, 50) * 1000:>9.1f}{percentile(seconds, 95) * 1000:>9.1f}"
+                f"{percentile(seconds, 99) * 1000:>9.1f}")
+        out('')
+        out(f"{pipelines} pipelines in {elapsed:.2f} s, {pipelines / elapsed:.2f} pipelines/s, "
+            f"{bench.errors['timeout']} timed out")
+        out("exec requests: " + ', '.join(f"{k} {v}" for k, v in sorted(fake.requests.items())))
+        if fake.failures:
+            out("injected failures: " + ', '.join(f"{k} {v}" for k, v in sorted(fake.failures.items())))
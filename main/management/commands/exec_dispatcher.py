@@ -0,0 +1,64 @@
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main.models_impl import ExecJob
+
+logger = logging.getLogger(__name__)
+
+
+def _dispatch(job: ExecJob):
+    # A job that fails here, e.g. on a locked database, is left to be claimed again once its lease is over
+    try:
+        close_old_connections()
+        job.dispatch()
+    except Exception:
+        logger.exception("Failed to dispatch %s", job)
+
+
+class Command(BaseCommand):
+    help = "Sends queued submissions and runs to exec"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.EXEC_QUEUE_CONCURRENCY,
+            help="Maximum number of requests to exec in flight",
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=settings.EXEC_QUEUE_INTERVAL,
+            help="Seconds to sleep when the queue is empty",
+        )
+        parser.add_argument('--once', action='store_true', help="Drain the jobs that are due now and exit")
+
+    def handle(self, *args, concurrency, interval, once, **options):
+        inFlight = set()
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                while True:
+                    close_old_connections()
+                    # Only claim what can be started right away, so that other dispatchers can take the rest
+                    try:
+                        jobs = ExecJob.claim(concurrency - len(inFlight)) if len(inFlight) < concurrency else []
+                    except Exception:
+                        logger.exception("Failed to claim jobs")
+                        jobs = []
+                    inFlight.update(pool.submit(_dispatch, job) for job in jobs)
+                    if once and not inFlight:
+                        return
+                    if inFlight:
+                        done, inFlight = wait(inFlight, timeout=interval, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    else:
+                        time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,107 @@
+import datetime
+import gc
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.tools.exec_api import CompilationStatus, ExitStatus, RunStatus, Statistics
+
+
+def _stats(rnd: random.Random) -> str:
+    return (
+        f"time.wall: {rnd.randrange(10 ** 7)}\n"
+        f"time.cpu.total: {rnd.randrange(10 ** 7)}\n"
+        f"time.cpu.user: {rnd.randrange(10 ** 7)}\n"
+        f"time.cpu.system: {rnd.randrange(10 ** 6)}\n"
+        f"memory.max: {rnd.randrange(1 << 30)}\n"
+        f"status: {rnd.choice(('exited', 'signaled'))} {rnd.randrange(256)}\n"
+        f"verdict: {rnd.choice(('OK', 'TL', 'WT', 'ML'))}\n"
+    )
+
+
+def _payloads(count: int, seed: int):
+    # Finished compilations and runs, the ones that carry statistics, as they come out of json
+    rnd = random.Random(seed)
+    compilations, runs = [], []
+    for i in range(count):
+        if i % 2:
+            runs.append({'status': 'finished', 'stdout-id': f'out-{i}', 'stderr-id': f'err-{i}', 'stats': _stats(rnd)})
+        else:
+            compilations.append(
+                {'status': 'finished', 'binary-id': f'bin-{i}', 'error-log-id': f'log-{i}', 'stats': _stats(rnd)}
+            )
+    return compilations, runs
+
+
+def _perFieldStatistics(statistics: str) -> Statistics:
+    # The parser Statistics.FromExec replaced, as the baseline it is measured against:
+    # a dict of all the lines, then a lookup and a conversion per field
+    stats = {k: v for k, v in map(lambda x: x.split(": "), statistics.strip().split('\n'))}
+    tp, code = stats["status"].split()
+    if tp == "signaled":
+        tp = ExitStatus.Type.SIGNALED
+    elif tp == "exited":
+        tp = ExitStatus.Type.EXITED
+    return Statistics(
+        wallTime=datetime.timedelta(microseconds=int(stats["time.wall"])),
+        cpuTotalTime=datetime.timedelta(microseconds=int(stats["time.cpu.total"])),
+        cpuUserTime=datetime.timedelta(microseconds=int(stats["time.cpu.user"])),
+        cpuSystemTime=datetime.timedelta(microseconds=int(stats["time.cpu.system"])),
+        maxMemory=int(stats["memory.max"]),
+        exitStatus=ExitStatus(code=int(code), type=tp),
+        verdict=stats["verdict"],
+    )
+
+
+def _best(functions, repeat: int) -> list:
+    # Passes of the functions are interleaved, so that a noisy neighbour slows them all alike
+    best = [float('inf')] * len(functions)
+    for _ in range(repeat):
+        for i, function in enumerate(functions):
+            gc.collect()
+            start = time.perf_counter()
+            function()
+            best[i] = min(best[i], time.perf_counter() - start)
+    return best
+
+
+class Command(BaseCommand):
+    help = "Measures how fast exec status payloads are parsed and how much memory the parsed statuses take"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100000, help="Number of status payloads")
+        parser.add_argument('--repeat', type=int, default=5, help="Number of timed passes, the best one is reported")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, count, repeat, seed, **options):
+        compilations, runs = _payloads(count, seed)
+
+        def parse():
+            return [CompilationStatus.FromExec(p) for p in compilations] + [RunStatus.FromExec(p) for p in runs]
+
+        texts = [p['stats'] for p in compilations + runs]
+        if [Statistics.FromExec(t) for t in texts] != [_perFieldStatistics(t) for t in texts]:
+            raise CommandError("The single pass and the per-field parser disagree")
+        best, singlePass, baseline = _best((
+            parse,
+            lambda: [Statistics.FromExec(t) for t in texts],
+            lambda: [_perFieldStatistics(t) for t in texts],
+        ), repeat)
+
+        gc.collect()
+        tracemalloc.start()
+        parsed = parse()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del parsed
+
+        self.stdout.write(
+            f"{count} statuses: {best * 1000:.1f} ms, {count / best:,.0f} statuses/s, "
+            f"{best / count * 1e6:.2f} us/status, {size / count:.0f} bytes/status"
+        )
+        self.stdout.write(
+            f"statistics alone: single pass {singlePass * 1000:.1f} ms, per-field baseline {baseline * 1000:.1f} ms, "
+            f"{baseline / singlePass:.2f}x"
+        )
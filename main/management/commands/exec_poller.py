@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main.models_impl import Submission, Run
+
+
+class Command(BaseCommand):
+    help = "Keeps the status of pending submissions and runs in sync with exec"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=settings.EXEC_POLLER_INTERVAL,
+            help="Seconds to sleep when there is nothing due",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.EXEC_POLLER_BATCH_SIZE,
+            help="Maximum number of rows of each kind claimed per cycle",
+        )
+        parser.add_argument('--once', action='store_true', help="Do a single cycle and exit")
+
+    def handle(self, *args, interval, batch_size, once, **options):
+        try:
+            while True:
+                close_old_connections()
+                busy = False
+                for model in (Submission, Run):
+                    if model.tryUpdateAll(batchSize=batch_size) >= batch_size:
+                        busy = True
+                if once:
+                    return
+                if not busy:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
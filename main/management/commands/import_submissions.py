@@ -0,0 +1,65 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models_impl import ImportReport, importSubmissions
+from main.tools.archives import iterArchive, iterDirectory
+
+
+class Command(BaseCommand):
+    help = "Imports every file of a zip or tar archive, or of a directory, as a submission of the given user"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path, help="Archive or directory of sources")
+        parser.add_argument('--user', required=True, help="Username the submissions belong to")
+        parser.add_argument(
+            '--dispatch',
+            action='store_true',
+            help="Send every chunk to exec right away, like `exec_dispatcher --once`, instead of leaving it queued",
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.EXEC_QUEUE_CONCURRENCY,
+            help="Maximum number of requests to exec in flight with --dispatch",
+        )
+        parser.add_argument(
+            '--wait',
+            action='store_true',
+            help="Wait for a running exec_dispatcher while the queue is full, instead of stopping",
+        )
+
+    def handle(self, *args, path, user, dispatch, concurrency, wait, **options):
+        try:
+            owner = get_user_model().objects.get(username=user)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user {user}")
+
+        maxBytes, maxEntries = settings.EXEC_SOURCE_MAX_BYTES, settings.EXEC_IMPORT_MAX_ENTRIES
+        if path.is_dir():
+            entries = iterDirectory(path, maxBytes, maxEntries)
+            report = self._import(owner, entries, dispatch, concurrency, wait)
+        else:
+            try:
+                with open(path, 'rb') as file:
+                    report = self._import(owner, iterArchive(file, maxBytes, maxEntries), dispatch, concurrency, wait)
+            except OSError as e:
+                raise CommandError(e)
+
+        for name, error in report.rejected:
+            self.stderr.write(f"Skipped {name}: {error}")
+        if report.stopped:
+            raise CommandError(f"Stopped after {report.imported} submissions: {report.stopped}")
+
+    def _import(self, owner, entries, dispatch: bool, concurrency: int, wait: bool) -> ImportReport:
+        def progress(report: ImportReport):
+            self.stdout.write(
+                f"{report.imported} imported, {report.reused} of them already compiled, {len(report.rejected)} skipped"
+            )
+            if dispatch:
+                call_command('exec_dispatcher', once=True, concurrency=concurrency)
+
+        return importSubmissions(owner, entries, progress, waitWhenOverloaded=wait)
@@ -0,0 +1,72 @@
+import hmac
+import logging
+import random
+import re
+import time
+
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from main.tools.profiling import Profile
+
+logger = logging.getLogger(__name__)
+
+_UNSAFE_RE = re.compile(r'[^A-Za-z0-9_-]+')
+
+
+class ProfilingMiddleware:
+    # Opt-in per request: a request carrying `X-Profile: <profiling token>` gets a Server-Timing header with the
+    # time spent in exec calls, SQL queries and templates, and a share of all requests is sampled and logged.
+    # With a profiling directory configured, profiled requests are also run under cProfile and dumped there.
+    # cProfile only sees the thread the middleware runs on: for async views under WSGI that is the ORM work,
+    # under ASGI the event loop, which other requests share.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.isAsync = iscoroutinefunction(get_response)
+        if self.isAsync:
+            markcoroutinefunction(self)
+
+    def __call__(self, req):
+        if self.isAsync:
+            return self.__acall__(req)
+        requested, sampled = self._wanted(req)
+        if not requested and not sampled:
+            return self.get_response(req)
+        with Profile(cprofile=bool(settings.PROFILING_DIR)) as profile:
+            resp = self.get_response(req)
+        return self._finish(req, resp, profile, requested)
+
+    async def __acall__(self, req):
+        requested, sampled = self._wanted(req)
+        if not requested and not sampled:
+            return await self.get_response(req)
+        with Profile(cprofile=bool(settings.PROFILING_DIR)) as profile:
+            resp = await self.get_response(req)
+        return self._finish(req, resp, profile, requested)
+
+    @staticmethod
+    def _wanted(req):
+        header = req.headers.get('X-Profile')
+        requested = bool(header and settings.PROFILING_TOKEN and hmac.compare_digest(header, settings.PROFILING_TOKEN))
+        sampled = settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE
+        return requested, sampled
+
+    @staticmethod
+    def _finish(req, resp, profile: Profile, requested: bool):
+        # Streamed bodies are sent after this, so their time is not in the profile
+        if requested:
+            resp['Server-Timing'] = profile.serverTiming()
+        logger.info("Profiled %s %s: %s", req.method, req.path, profile.serverTiming())
+        if profile.profiler is not None:
+            name = _UNSAFE_RE.sub('_', req.path).strip('_') or 'index'
+            path = Path(settings.PROFILING_DIR) / f'{time.time() * 1000:.0f}-{req.method}-{name}.prof'
+            try:
+                profile.dump(path)
+            except OSError as e:
+                logger.warning("Failed to write profile %s: %r", path, e)
+        return resp
@@ -0,0 +1,87 @@
+# Generated by Django 4.2.1 on 2026-10-18 13:32
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_alter_compilationresult_binaryid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RunResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cpuTotalUsage', models.DurationField()),
+                ('cpuSystemUsage', models.DurationField()),
+                ('cpuUserUsage', models.DurationField()),
+                ('wallTime', models.DurationField()),
+                ('maxMemoryBytes', models.PositiveIntegerField()),
+                ('verdict', models.CharField(choices=[('OK', 'Ok'), ('WT', 'Wall time limit'), ('TL', 'Time limit'), ('ML', 'Memory limit')], max_length=2)),
+                ('exitStatus_type', models.CharField(choices=[('E', 'Exited'), ('S', 'Signaled')], max_length=1)),
+                ('exitStatus_code', models.SmallIntegerField()),
+                ('stdoutId', models.TextField(max_length=64)),
+                ('stderrId', models.TextField(max_length=64)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RenameField(
+            model_name='compilationresult',
+            old_name='cpuUsage',
+            new_name='cpuTotalUsage',
+        ),
+        migrations.AddField(
+            model_name='compilationresult',
+            name='cpuSystemUsage',
+            field=models.DurationField(default=datetime.timedelta(0)),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='compilationresult',
+            name='cpuUserUsage',
+            field=models.DurationField(default=datetime.timedelta(0)),
+            preserve_default=False,
+        ),
+        migrations.RenameField(
+            model_name='submission',
+            old_name='status',
+            new_name='execStatus',
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='execStatus',
+            field=models.TextField(choices=[('EN', 'Enqueued'), ('RU', 'Running'), ('FI', 'Finished')], default='EN', max_length=2),
+        ),
+        migrations.AlterField(
+            model_name='compilationresult',
+            name='binaryId',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='execId',
+            field=models.TextField(max_length=64),
+        ),
+        migrations.CreateModel(
+            name='Run',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('execId', models.TextField(max_length=64)),
+                ('execStatus', models.TextField(choices=[('EN', 'Enqueued'), ('RU', 'Running'), ('FI', 'Finished')], default='EN', max_length=2)),
+                ('nextCheck', models.DateTimeField(default=django.utils.timezone.now, null=True)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('runResult', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='main.runresult')),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.submission')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
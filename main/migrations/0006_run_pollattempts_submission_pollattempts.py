@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_runresult_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='run',
+            name='pollAttempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='pollAttempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.1 on 2026-10-18 13:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_run_pollattempts_submission_pollattempts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='run',
+            name='execId',
+            field=models.TextField(db_index=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='execId',
+            field=models.TextField(db_index=True, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='run',
+            index=models.Index(condition=models.Q(('nextCheck__isnull', False)), fields=['nextCheck'], name='main_run_due'),
+        ),
+        migrations.AddIndex(
+            model_name='run',
+            index=models.Index(fields=['submission', '-timestamp'], name='main_run_submission_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(condition=models.Q(('nextCheck__isnull', False)), fields=['nextCheck'], name='main_submission_due'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['user', '-timestamp'], name='main_submission_user_ts'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.1 on 2026-10-18 13:35
+
+from django.db import migrations, models
+
+
+def computeOverallStatus(row, result):
+    if row.execStatus != 'FI':
+        return row.execStatus
+    if result.verdict != 'OK':
+        return result.verdict
+    if result.exitStatus_type != 'E' or result.exitStatus_code != 0:
+        return 'RT'
+    return 'OK'
+
+
+def backfillOverallStatus(apps, schema_editor):
+    for modelName, resultField in (('Submission', 'compilationResult'), ('Run', 'runResult')):
+        model = apps.get_model('main', modelName)
+        rows = []
+        for row in model.objects.select_related(resultField).iterator(chunk_size=1000):
+            row.overallStatus = computeOverallStatus(row, getattr(row, resultField))
+            rows.append(row)
+            if len(rows) >= 1000:
+                model.objects.bulk_update(rows, ['overallStatus'])
+                rows = []
+        model.objects.bulk_update(rows, ['overallStatus'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_alter_run_execid_alter_submission_execid_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='run',
+            name='overallStatus',
+            field=models.TextField(choices=[('OK', 'Ok'), ('WT', 'Wall Time Limit'), ('TL', 'Cpu Time Limit'), ('ML', 'Memory Limit'), ('EN', 'Enqueued'), ('RU', 'Running'), ('RT', 'Run-time error')], default='EN', max_length=2),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='overallStatus',
+            field=models.TextField(choices=[('OK', 'Ok'), ('WT', 'Wall Time Limit'), ('TL', 'Cpu Time Limit'), ('ML', 'Memory Limit'), ('EN', 'Enqueued'), ('RU', 'Running'), ('RT', 'Run-time error')], default='EN', max_length=2),
+        ),
+        migrations.RunPython(backfillOverallStatus, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.1 on 2026-10-18 13:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_run_overallstatus_submission_overallstatus'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='run',
+            name='main_run_submission_ts',
+        ),
+        migrations.RemoveIndex(
+            model_name='submission',
+            name='main_submission_user_ts',
+        ),
+        migrations.AddIndex(
+            model_name='run',
+            index=models.Index(fields=['submission', '-timestamp', '-id'], name='main_run_submission_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='main_submission_user_ts'),
+        ),
+    ]
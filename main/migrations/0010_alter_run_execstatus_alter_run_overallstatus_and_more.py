@@ -0,0 +1,56 @@
+# Generated by Django 4.2.1 on 2026-10-18 13:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_remove_run_main_run_submission_ts_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='run',
+            name='execStatus',
+            field=models.TextField(choices=[('EN', 'Enqueued'), ('RU', 'Running'), ('FI', 'Finished'), ('FA', 'Failed')], default='EN', max_length=2),
+        ),
+        migrations.AlterField(
+            model_name='run',
+            name='overallStatus',
+            field=models.TextField(choices=[('OK', 'Ok'), ('WT', 'Wall Time Limit'), ('TL', 'Cpu Time Limit'), ('ML', 'Memory Limit'), ('EN', 'Enqueued'), ('RU', 'Running'), ('FA', 'Failed'), ('RT', 'Run-time error')], default='EN', max_length=2),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='execStatus',
+            field=models.TextField(choices=[('EN', 'Enqueued'), ('RU', 'Running'), ('FI', 'Finished'), ('FA', 'Failed')], default='EN', max_length=2),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='overallStatus',
+            field=models.TextField(choices=[('OK', 'Ok'), ('WT', 'Wall Time Limit'), ('TL', 'Cpu Time Limit'), ('ML', 'Memory Limit'), ('EN', 'Enqueued'), ('RU', 'Running'), ('FA', 'Failed'), ('RT', 'Run-time error')], default='EN', max_length=2),
+        ),
+        migrations.CreateModel(
+            name='ExecJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.TextField(choices=[('SU', 'Submit'), ('RU', 'Run')], max_length=2)),
+                ('state', models.TextField(choices=[('PE', 'Pending'), ('DI', 'Dispatching'), ('FA', 'Failed')], default='PE', max_length=2)),
+                ('payload', models.BinaryField(blank=True, null=True)),
+                ('argument', models.TextField(blank=True, default='')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('nextAttempt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('leaseOwner', models.TextField(blank=True, default='')),
+                ('leaseUntil', models.DateTimeField(blank=True, null=True)),
+                ('lastError', models.TextField(blank=True, default='')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('run', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='main.run')),
+                ('submission', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='main.submission')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('state__in', ['PE', 'DI'])), fields=['nextAttempt'], name='main_execjob_unfinished')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.1 on 2026-10-18 13:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_alter_run_execstatus_alter_run_overallstatus_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RunBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='runbatch',
+            name='submission',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.submission'),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='main.runbatch'),
+        ),
+        migrations.AddIndex(
+            model_name='run',
+            index=models.Index(fields=['batch', '-timestamp', '-id'], name='main_run_batch_ts'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.1 on 2026-10-18 13:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_runbatch_run_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='reusedFrom',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='main.submission'),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='sourceHash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(condition=models.Q(('reusedFrom__isnull', True)), fields=['sourceHash', '-timestamp'], name='main_submission_source'),
+        ),
+    ]
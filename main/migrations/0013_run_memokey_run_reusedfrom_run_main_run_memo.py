@@ -0,0 +1,28 @@
+# Generated by Django 4.2.1 on 2026-10-18 13:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_submission_reusedfrom_submission_sourcehash_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='run',
+            name='memoKey',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='reusedFrom',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='main.run'),
+        ),
+        migrations.AddIndex(
+            model_name='run',
+            index=models.Index(condition=models.Q(('reusedFrom__isnull', True)), fields=['memoKey', '-timestamp'], name='main_run_memo'),
+        ),
+    ]
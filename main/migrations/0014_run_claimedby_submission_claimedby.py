@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-18 13:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_run_memokey_run_reusedfrom_run_main_run_memo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='run',
+            name='claimedBy',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='claimedBy',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
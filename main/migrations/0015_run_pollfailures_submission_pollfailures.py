@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_run_claimedby_submission_claimedby'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='run',
+            name='pollFailures',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='pollFailures',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
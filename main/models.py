@@ -1 +1 @@
-from .models_impl import Submission, CompilationResult, Run, RunResult
+from .models_impl import Submission, CompilationResult, Run, RunBatch, RunResult, ExecJob
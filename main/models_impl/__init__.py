@@ -4,9 +4,13 @@ from .submission import (
 )
 from .run import (
     Run,
+    RunBatch,
     RunResult,
 )
+from .exec_job import ExecJob
+from .submission_import import ImportReport, importSubmissions
 from .abstract_run_result import (
     OverallRunStatus,
     ExecStatus,
 )
+from .common import LISTED_FIELDS
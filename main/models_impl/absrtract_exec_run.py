@@ -1,20 +1,52 @@
+import logging
+import uuid
+
 from abc import abstractmethod
-from django.db import models
+from typing import Any, Dict, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, models, transaction
 from django.utils import timezone
 
+from main.tools.exec_api import describeError
+from main.tools.metrics import pollLag, timeToVerdict
+from main.tools.status_cache import statusCache
 from .abstract_run_result import ExecStatus, OverallRunStatus, AbstractRunResult
 from .abc_model_meta import ABCModelMeta
 from .common import EXEC_ID_MAXLENGTH
+from .polling import getPollingSchedule
+
+logger = logging.getLogger(__name__)
 
 
 class AbstractExecRun(models.Model, metaclass=ABCModelMeta):
-    execId = models.TextField(max_length=EXEC_ID_MAXLENGTH)
+    # Not unique: callbacks are applied to every row with the exec id
+    execId = models.TextField(max_length=EXEC_ID_MAXLENGTH, db_index=True)
     execStatus = models.TextField(max_length=2, choices=ExecStatus.choices, default=ExecStatus.ENQUEUED)
     nextCheck = models.DateTimeField(default=timezone.now, null=True)
     timestamp = models.DateTimeField(default=timezone.now)
+    # Polls since the exec status last changed, drives the polling schedule
+    pollAttempts = models.PositiveIntegerField(default=0)
+    # Failed polls in a row, drives the backoff while exec is unreachable
+    pollFailures = models.PositiveIntegerField(default=0)
+    # Denormalized from execStatus and the result, so that listing rows needs no joins
+    overallStatus = models.TextField(max_length=2, choices=OverallRunStatus.choices, default=OverallRunStatus.ENQUEUED)
+    # The worker polling the row, which has moved nextCheck to the end of its lease meanwhile
+    claimedBy = models.CharField(max_length=32, blank=True, default='')
+    # Set on rows that copy the result of an identical earlier row instead of going to exec
+    reusedFrom = models.ForeignKey(to='self', on_delete=models.SET_NULL, null=True, blank=True)
+
+    # Name of the foreign key to the result, used for bulk updates
+    _resultField = None
+
+    @staticmethod
+    @abstractmethod
+    def _resultFromOutcome(outcome) -> AbstractRunResult:
+        pass
 
     @abstractmethod
-    def _updateFromOutcome(self, outcome):
+    def _setResult(self, result: AbstractRunResult):
         pass
 
     @staticmethod
@@ -22,40 +54,228 @@ class AbstractExecRun(models.Model, metaclass=ABCModelMeta):
     def _fetchStatusFromExec(id: str):
         pass
 
+    @staticmethod
+    @abstractmethod
+    def _fetchStatusesFromExec(ids: List[str]) -> Dict[str, Any]:
+        pass
+
+    @staticmethod
+    @abstractmethod
+    async def _afetchStatusFromExec(id: str):
+        pass
+
     @abstractmethod
     def _getResult(self) -> AbstractRunResult:
         pass
 
+    def _isDue(self) -> bool:
+        return self.nextCheck is not None and self.nextCheck <= timezone.now()
+
     def tryUpdate(self, force=False):
-        if (self.nextCheck is None or self.nextCheck > timezone.now()) and not force:
+        if not self._isDue() and not force:
+            return
+        owner = self._claim(force)
+        if owner is None:
             return
-        print(f"Trying to update {self}")
-        status = self._fetchStatusFromExec(self.execId)
-        print(f"{status=}")
-        self.nextCheck = timezone.now() + timezone.timedelta(milliseconds=500)
-        self.execStatus = ExecStatus.FromExec(status.execStatus)
+        logger.debug("Trying to update %s", self)
+        try:
+            status = statusCache.get(self._meta.model_name, self.execId, self._fetchStatusFromExec)
+        except Exception:
+            self._release(owner)
+            raise
+        self._applyClaimed(status, owner)
+
+    async def atryUpdate(self, force=False):
+        if not self._isDue() and not force:
+            return
+        owner = await sync_to_async(self._claim)(force)
+        if owner is None:
+            return
+        logger.debug("Trying to update %s", self)
+        try:
+            status = await statusCache.aget(self._meta.model_name, self.execId, self._afetchStatusFromExec)
+        except BaseException:
+            # Including cancellation, when a page stops waiting for exec
+            await sync_to_async(self._release)(owner)
+            raise
+        await sync_to_async(self._applyClaimed)(status, owner)
+
+    @staticmethod
+    def _lease() -> Tuple[str, Any]:
+        return uuid.uuid4().hex, timezone.now() + timezone.timedelta(seconds=settings.EXEC_POLLER_LEASE)
+
+    def _claim(self, force=False) -> Optional[str]:
+        # Returns None if the row is not due anymore, e.g. because the poller or another viewer has claimed it
+        owner, leaseUntil = self._lease()
+        rows = type(self).objects.filter(pk=self.pk)
+        if not force:
+            rows = rows.filter(nextCheck__lte=timezone.now())
+        if not rows.update(nextCheck=leaseUntil, claimedBy=owner):
+            return None
+        self.nextCheck, self.claimedBy = leaseUntil, owner
+        return owner
+
+    def _release(self, owner: str):
+        type(self).objects.filter(pk=self.pk, claimedBy=owner).update(nextCheck=timezone.now(), claimedBy='')
+
+    def _applyClaimed(self, status, owner: str):
+        with transaction.atomic():
+            # A callback may have applied a newer status meanwhile
+            if not type(self).objects.select_for_update().filter(pk=self.pk, claimedBy=owner).exists():
+                return
+            self._applyStatus(status)
+
+    def _scheduleNextCheck(self, failed=False):
+        if failed:
+            self.pollFailures += 1
+            attempt = self.pollFailures
+        else:
+            self.pollAttempts += 1
+            attempt = self.pollAttempts
+        self.nextCheck = timezone.now() + getPollingSchedule().nextDelay(attempt, self.execStatus, failed)
+
+    def _applyStatus(self, status, save=True):
+        # With save=False a newly built result is left unsaved, so that the caller can write it in bulk
+        logger.debug("%s: %s", self, status)
+        self.claimedBy = ''
+        execStatus = ExecStatus.FromExec(status.execStatus)
+        self.pollFailures = 0
+        if execStatus != self.execStatus:
+            self.pollAttempts = 0
+        self.execStatus = execStatus
 
         if self.execStatus != ExecStatus.FINISHED:
-            self.save()
+            self._scheduleNextCheck()
+            self.overallStatus = self._computeOverallStatus()
+            if save:
+                self.save()
             return
 
         self.nextCheck = None
 
         try:
-            self._updateFromOutcome(status.outcome)
+            self._setResult(self._resultFromOutcome(status.outcome))
+            if save:
+                self._getResult().save()
+            timeToVerdict.observe((timezone.now() - self.timestamp).total_seconds(), model=self._meta.model_name)
         except Exception as e:
-            print(f"Exception caught while trying to fetch result from exec: {e}", file=sys.stderr)
+            logger.warning("Failed to read the result of %s from exec: %r", self, e)
+            self._setResult(None)
             self.execStatus = ExecStatus.ENQUEUED
-            self.nextCheck = timezone.now() + timezone.timedelta(microseconds=500)
+            self._scheduleNextCheck(failed=True)
+
+        self.overallStatus = self._computeOverallStatus()
+        if save:
+            self.save()
 
-        self.save()
+    @classmethod
+    def updateByExecId(cls, execId: str, status) -> int:
+        # Applies a status pushed by exec; returns the number of rows it matched
+        statusCache.put(cls._meta.model_name, execId, status)
+        with transaction.atomic():
+            rows = list(cls.objects.select_for_update().filter(execId=execId, nextCheck__isnull=False))
+            for row in rows:
+                row._applyStatus(status)
+        return len(rows)
+
+    @classmethod
+    def tryUpdateAll(cls, batchSize=None) -> int:
+        # Most overdue rows first; returns how many rows were processed so the caller knows if more are pending
+        owner, rows = cls._claimDue(batchSize)
+        chunkSize = settings.EXEC_API_STATUS_BATCH_SIZE
+        for i in range(0, len(rows), chunkSize):
+            cls._updateChunk(rows[i:i + chunkSize], owner)
+        return len(rows)
 
     @classmethod
-    def tryUpdateAll(cls):
-        for subm in cls.objects.filter(nextCheck__lt=timezone.now()):
-            subm.tryUpdate()
+    def _claimDue(cls, batchSize=None) -> Tuple[str, list]:
+        # Claiming moves nextCheck to the end of a lease, so concurrent pollers split the due rows between them,
+        # and a poller that dies leaves its rows to the others once the lease is over
+        owner, leaseUntil = cls._lease()
+        now = timezone.now()
+        due = cls.objects.filter(nextCheck__lte=now).order_by('nextCheck').values_list('pk', 'nextCheck')
+        if connection.features.has_select_for_update_skip_locked:
+            with transaction.atomic():
+                # Rows being claimed by another poller are skipped rather than waited for
+                selected = dict(due.select_for_update(skip_locked=True)[:batchSize])
+                cls.objects.filter(pk__in=selected).update(nextCheck=leaseUntil, claimedBy=owner)
+        else:
+            selected = dict(due[:batchSize])
+            # Re-checking nextCheck makes the update atomic: a row claimed by someone else meanwhile is not due anymore
+            cls.objects.filter(pk__in=selected, nextCheck__lte=now).update(nextCheck=leaseUntil, claimedBy=owner)
+        rows = list(cls.objects.filter(pk__in=selected, claimedBy=owner).order_by('pk'))
+        for row in rows:
+            pollLag.observe((now - selected[row.pk]).total_seconds(), model=cls._meta.model_name)
+        return owner, rows
+
+    @classmethod
+    def _updateChunk(cls, rows, owner: str):
+        try:
+            statuses = cls._fetchStatusesFromExec([row.execId for row in rows])
+            statusCache.putMany(cls._meta.model_name, statuses)
+        except Exception as e:
+            logger.warning("Failed to fetch statuses of %d %s rows: %s", len(rows), cls.__name__, describeError(e))
+            statuses = {}
+
+        for row in rows:
+            status = statuses.get(row.execId)
+            if status is None:
+                # Back off, so that failing rows don't starve the rest of the queue
+                row.claimedBy = ''
+                row._scheduleNextCheck(failed=True)
+                continue
+            row._applyStatus(status, save=False)
+
+        with transaction.atomic():
+            # Rows a callback has updated meanwhile are left alone, their status is newer
+            owned = set(
+                cls.objects.select_for_update().filter(pk__in=[row.pk for row in rows], claimedBy=owner)
+                .values_list('pk', flat=True)
+            )
+            rows = [row for row in rows if row.pk in owned]
+            results = [row._getResult() for row in rows if row._getResult() is not None and row._getResult().pk is None]
+            if results and connection.features.can_return_rows_from_bulk_insert:
+                type(results[0]).objects.bulk_create(results)
+            else:
+                # Other backends, MySQL among them, don't return the primary keys of a bulk insert; results
+                # have nothing to read them back by, so they are inserted one by one there
+                for result in results:
+                    result.save()
+            if results:
+                for row in rows:
+                    # Re-assign, so that the foreign key picks up the primary key set by the insert
+                    row._setResult(row._getResult())
+            cls.objects.bulk_update(
+                rows,
+                [
+                    'execStatus', 'nextCheck', 'pollAttempts', 'pollFailures', 'overallStatus', 'claimedBy',
+                    cls._resultField,
+                ],
+            )
+
+    @classmethod
+    def _reusable(cls, window, **match):
+        # Successful originals within the window, newest first. Copies are never reused,
+        # so that resubmitting does not keep an exec result alive past the window.
+        if window == 0:
+            return cls.objects.none()
+        candidates = cls.objects.filter(reusedFrom__isnull=True, overallStatus=OverallRunStatus.OK, **match)
+        if window is not None:
+            candidates = candidates.filter(timestamp__gte=timezone.now() - timezone.timedelta(seconds=window))
+        return candidates.order_by('-timestamp')
+
+    def _reuse(self, original):
+        self.reusedFrom = original
+        self.execId = original.execId
+        setattr(self, f'{self._resultField}_id', getattr(original, f'{self._resultField}_id'))
+        self.execStatus = ExecStatus.FINISHED
+        self.overallStatus = original.overallStatus
+        self.nextCheck = None
+
+    def isPending(self) -> bool:
+        return self.overallStatus in (OverallRunStatus.ENQUEUED, OverallRunStatus.RUNNING)
 
-    def overallStatus(self) -> OverallRunStatus:
+    def _computeOverallStatus(self) -> OverallRunStatus:
         if self.execStatus != ExecStatus.FINISHED:
             return OverallRunStatus.FromExecStatus(self.execStatus)
         if self._getResult().verdict != AbstractRunResult.RunResult.OK:
@@ -66,3 +286,11 @@ class AbstractExecRun(models.Model, metaclass=ABCModelMeta):
 
     class Meta:
         abstract = True
+        indexes = [
+            # Finished rows have no nextCheck, so the poller's index only holds the pending ones
+            models.Index(
+                fields=['nextCheck'],
+                condition=models.Q(nextCheck__isnull=False),
+                name='%(app_label)s_%(class)s_due',
+            ),
+        ]
@@ -71,6 +71,8 @@ class ExecStatus(models.TextChoices):
     ENQUEUED = "EN", _("Enqueued")
     RUNNING = "RU", _("Running")
     FINISHED = "FI", _("Finished")
+    # Never got to exec, see ExecJob
+    FAILED = "FA", _("Failed")
 
     @staticmethod
     def FromExec(s: execApi.ExecStatus) -> ExecStatus:
@@ -101,6 +103,7 @@ class OverallRunStatus(models.TextChoices):
 
     ENQUEUED = ExecStatus.ENQUEUED
     RUNNING = ExecStatus.RUNNING
+    FAILED = ExecStatus.FAILED
 
     @staticmethod
     def FromExecStatus(cs: ExecStatus) -> 'OverallRunStatus':
@@ -108,5 +111,7 @@ class OverallRunStatus(models.TextChoices):
             return OverallRunStatus.ENQUEUED
         if cs == ExecStatus.RUNNING:
             return OverallRunStatus.RUNNING
+        if cs == ExecStatus.FAILED:
+            return OverallRunStatus.FAILED
 
     RUNTIME_ERROR = "RT", _("Run-time error")
\ No newline at end of file
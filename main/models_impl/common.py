@@ -1 +1,5 @@
 EXEC_ID_MAXLENGTH = 64
+
+# What the listing pages show of a submission or a run.
+# Querysets of related managers also need the foreign key to the owner, which they fill in.
+LISTED_FIELDS = ('id', 'timestamp', 'execStatus', 'overallStatus')
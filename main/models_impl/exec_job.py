@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import logging
+import random
+import uuid
+
+from typing import List
+
+import httpx
+from django.conf import settings
+from django.core.files import File
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from main.tools import exec_api as execApi
+from main.tools.circuit_breaker import CircuitOpenError
+from .abstract_run_result import ExecStatus, OverallRunStatus
+from .run import Run, RunBatch
+from .submission import Submission
+
+logger = logging.getLogger(__name__)
+
+
+class ExecJob(models.Model):
+    # Outbox of requests to exec: views record what should be sent and return right away,
+    # `manage.py exec_dispatcher` sends it with bounded concurrency and retries.
+    # Delivery is at least once: a dispatcher dying mid-request has its jobs picked up again after the lease.
+    # Delivered jobs are deleted, failed ones are kept for inspection.
+
+    class Kind(models.TextChoices):
+        SUBMIT = "SU", _("Submit")
+        RUN = "RU", _("Run")
+
+    class State(models.TextChoices):
+        PENDING = "PE", _("Pending")
+        DISPATCHING = "DI", _("Dispatching")
+        FAILED = "FA", _("Failed")
+
+    kind = models.TextField(max_length=2, choices=Kind.choices)
+    state = models.TextField(max_length=2, choices=State.choices, default=State.PENDING)
+    submission = models.ForeignKey(to=Submission, on_delete=models.CASCADE, null=True, blank=True)
+    run = models.ForeignKey(to=Run, on_delete=models.CASCADE, null=True, blank=True)
+    # The source for SUBMIT or the stdin for RUN, dropped once it is in exec
+    payload = models.BinaryField(null=True, blank=True)
+    # The binary id for RUN
+    argument = models.TextField(blank=True, default='')
+
+    attempts = models.PositiveIntegerField(default=0)
+    nextAttempt = models.DateTimeField(default=timezone.now)
+    leaseOwner = models.TextField(blank=True, default='')
+    leaseUntil = models.DateTimeField(null=True, blank=True)
+    lastError = models.TextField(blank=True, default='')
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    @staticmethod
+    def _unfinished():
+        return ExecJob.objects.filter(state__in=(ExecJob.State.PENDING, ExecJob.State.DISPATCHING))
+
+    @staticmethod
+    def isOverloaded(incoming: int = 1) -> bool:
+        # Backpressure: rather turn new work away than let the backlog grow without bound while exec is slow
+        return ExecJob._unfinished().count() + incoming > settings.EXEC_QUEUE_MAX_PENDING
+
+    @staticmethod
+    def enqueueSubmission(subm: Submission, source: bytes) -> ExecJob:
+        # The submission is saved without an exec id and is not polled until the job delivers it
+        subm.execId = subm.sourceId = ''
+        subm.nextCheck = None
+        with transaction.atomic():
+            subm.save()
+            return ExecJob.objects.create(kind=ExecJob.Kind.SUBMIT, submission=subm, payload=source)
+
+    @staticmethod
+    def enqueueSubmissions(user, sources: List[bytes]) -> List[Submission]:
+        # Bulk counterpart of reuseCompilation and enqueueSubmission, for imports: sources compiled recently
+        # copy that compilation, the others get a job
+        hashes = [Submission.hashSource(source) for source in sources]
+        originals = {}
+        for original in Submission._reusable(settings.EXEC_COMPILE_REUSE_WINDOW, sourceHash__in=set(hashes)):
+            originals.setdefault(original.sourceHash, original)
+        now = timezone.now()
+        submissions = []
+        for sourceHash in hashes:
+            subm = Submission(user=user, sourceHash=sourceHash, execId='', sourceId='', nextCheck=None, timestamp=now)
+            original = originals.get(sourceHash)
+            if original is not None:
+                subm._reuse(original)
+                subm.sourceId = original.sourceId
+            submissions.append(subm)
+
+        with transaction.atomic():
+            Submission.objects.bulk_create(submissions)
+            # Not every backend returns primary keys from a bulk insert, so read them back in insertion order
+            submissions = list(Submission.objects.filter(user=user, timestamp=now).order_by('id'))
+            ExecJob.objects.bulk_create(
+                ExecJob(kind=ExecJob.Kind.SUBMIT, submission=subm, payload=source, timestamp=now)
+                for subm, source in zip(submissions, sources)
+                if subm.reusedFrom_id is None
+            )
+        return submissions
+
+    @staticmethod
+    def enqueueRun(run: Run, binaryId: str) -> ExecJob:
+        run.execId = ''
+        run.nextCheck = None
+        with transaction.atomic():
+            run.save()
+            return ExecJob.objects.create(kind=ExecJob.Kind.RUN, run=run, argument=binaryId)
+
+    @staticmethod
+    def enqueueRunBatch(batch: RunBatch, binaryId: str, inputs: List[File], memoize: bool = True) -> List[Run]:
+        # Inputs that already ran successfully copy the memoized result and get no job.
+        # Inputs are read one at a time, and jobs are inserted in groups of about EXEC_RUN_BATCH_INSERT_BYTES,
+        # so only that much of the batch is in memory at once.
+        keys = [Run.memoKeyForChunks(binaryId, input.chunks()) for input in inputs]
+        memoized = Run.findMemoized(keys) if memoize else {}
+        now = timezone.now()
+        runs = []
+        for key in keys:
+            run = Run(submission_id=batch.submission_id, memoKey=key, execId='', nextCheck=None, timestamp=now)
+            if key in memoized:
+                run._reuse(memoized[key])
+            runs.append(run)
+
+        with transaction.atomic():
+            batch.save()
+            for run in runs:
+                run.batch = batch
+            Run.objects.bulk_create(runs)
+            # Not every backend returns primary keys from a bulk insert, so read them back in insertion order
+            runs = list(batch.run_set.order_by('id'))
+            jobs, size = [], 0
+            for run, input in zip(runs, inputs):
+                if run.reusedFrom_id is not None:
+                    continue
+                payload = b''.join(input.chunks())
+                jobs.append(ExecJob(kind=ExecJob.Kind.RUN, run=run, argument=binaryId, payload=payload, timestamp=now))
+                size += len(payload)
+                if size >= settings.EXEC_RUN_BATCH_INSERT_BYTES:
+                    ExecJob.objects.bulk_create(jobs)
+                    jobs, size = [], 0
+            ExecJob.objects.bulk_create(jobs)
+        return runs
+
+    @staticmethod
+    def claim(limit: int) -> List[ExecJob]:
+        now = timezone.now()
+        due = ExecJob._unfinished().filter(
+            models.Q(state=ExecJob.State.PENDING, nextAttempt__lte=now) |
+            models.Q(state=ExecJob.State.DISPATCHING, leaseUntil__lt=now)
+        )
+        ids = list(due.order_by('nextAttempt').values_list('pk', flat=True)[:limit])
+        if not ids:
+            return []
+        # Re-checking the condition in the update makes it atomic: of two dispatchers only one gets a job
+        owner = uuid.uuid4().hex
+        due.filter(pk__in=ids).update(
+            state=ExecJob.State.DISPATCHING,
+            leaseOwner=owner,
+            leaseUntil=now + timezone.timedelta(seconds=settings.EXEC_QUEUE_LEASE),
+        )
+        return list(ExecJob.objects.filter(leaseOwner=owner, state=ExecJob.State.DISPATCHING))
+
+    def dispatch(self):
+        try:
+            if self.kind == ExecJob.Kind.SUBMIT:
+                inf = execApi.execApi.submit(bytes(self.payload))
+            elif self.kind == ExecJob.Kind.RUN:
+                input = None if self.payload is None else bytes(self.payload)
+                runId = execApi.execApi.run(self.argument, input)
+        except Exception as e:
+            self._retryOrFail(e)
+            return
+
+        # Exec has the job now. Should this fail, the job is sent again once its lease is over.
+        with transaction.atomic():
+            if self.kind == ExecJob.Kind.SUBMIT:
+                Submission.objects.filter(pk=self.submission_id).update(
+                    execId=inf.id,
+                    sourceId=inf.srcId,
+                    nextCheck=timezone.now(),
+                )
+            elif self.kind == ExecJob.Kind.RUN:
+                Run.objects.filter(pk=self.run_id).update(execId=runId, nextCheck=timezone.now())
+            self.delete()
+
+    def _retryOrFail(self, error: Exception):
+        logger.warning("Failed to dispatch %s: %s", self, execApi.describeError(error))
+        # Exec was not even asked while the circuit is open, so that does not use up an attempt
+        if not isinstance(error, CircuitOpenError):
+            self.attempts += 1
+        self.lastError = execApi.describeError(error)
+        self.leaseUntil = None
+        with transaction.atomic():
+            if self.attempts >= settings.EXEC_QUEUE_MAX_ATTEMPTS or not _isRetryable(error):
+                self.state = ExecJob.State.FAILED
+                self.payload = None
+                target = Submission.objects.filter(pk=self.submission_id) if self.kind == ExecJob.Kind.SUBMIT \
+                    else Run.objects.filter(pk=self.run_id)
+                target.update(execStatus=ExecStatus.FAILED, overallStatus=OverallRunStatus.FAILED, nextCheck=None)
+            else:
+                self.state = ExecJob.State.PENDING
+                delay = min(
+                    settings.EXEC_QUEUE_RETRY_CAP,
+                    settings.EXEC_QUEUE_RETRY_DELAY * 2 ** max(self.attempts - 1, 0),
+                )
+                self.nextAttempt = timezone.now() + timezone.timedelta(seconds=delay * random.uniform(0.5, 1))
+            # Not save(update_fields=...), which raises if the submission or run has been deleted along with the job
+            ExecJob.objects.filter(pk=self.pk).update(
+                attempts=self.attempts,
+                lastError=self.lastError,
+                leaseUntil=self.leaseUntil,
+                state=self.state,
+                payload=self.payload,
+                nextAttempt=self.nextAttempt,
+            )
+
+    def __str__(self):
+        return f"{self.get_kind_display()} job #{self.pk}"
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['nextAttempt'],
+                condition=models.Q(state__in=['PE', 'DI']),
+                name='main_execjob_unfinished',
+            ),
+        ]
+
+
+def _isRetryable(error: Exception) -> bool:
+    # Exec refusing the request itself won't change on retry, unlike timeouts, 5xx and rate limiting
+    if isinstance(error, httpx.HTTPStatusError):
+        code = error.response.status_code
+        return code >= 500 or code == 429
+    return True
@@ -0,0 +1,85 @@
+import functools
+import random
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .abstract_run_result import ExecStatus
+
+
+class PollingSchedule:
+    # Decides when a pending submission or run is checked again.
+    # `attempt` counts the polls since the row last changed its exec status, starting from 1,
+    # or for a failed poll, the polls that have failed in a row.
+
+    def nextDelay(self, attempt: int, status: ExecStatus, failed: bool = False) -> timezone.timedelta:
+        raise NotImplementedError
+
+
+class FixedSchedule(PollingSchedule):
+    def __init__(self, delay=0.5):
+        self.delay = timezone.timedelta(seconds=delay)
+
+    def nextDelay(self, attempt: int, status: ExecStatus, failed: bool = False) -> timezone.timedelta:
+        return self.delay
+
+
+class ExponentialBackoffSchedule(PollingSchedule):
+    # A few quick polls after every status change, as short jobs finish right away,
+    # then exponential growth up to a cap that depends on the status.
+    # Jitter keeps rows submitted together from being polled in lockstep.
+
+    def __init__(
+            self,
+            fastAttempts=3,
+            fastDelay=0.25,
+            enqueuedDelay=1.0,
+            enqueuedCap=10.0,
+            runningDelay=0.5,
+            runningCap=5.0,
+            failureDelay=1.0,
+            failureCap=60.0,
+            factor=2.0,
+            jitter=0.2,
+    ):
+        self.fastAttempts = fastAttempts
+        self.fastDelay = fastDelay
+        self.delays = {
+            ExecStatus.ENQUEUED: (enqueuedDelay, enqueuedCap),
+            ExecStatus.RUNNING: (runningDelay, runningCap),
+        }
+        self.failureDelay = failureDelay
+        self.failureCap = failureCap
+        self.factor = factor
+        self.jitter = jitter
+
+    def nextDelay(self, attempt: int, status: ExecStatus, failed: bool = False) -> timezone.timedelta:
+        if failed:
+            delay = min(self.failureCap, self.failureDelay * self.factor ** max(attempt - 1, 0))
+        elif attempt <= self.fastAttempts:
+            delay = self.fastDelay
+        else:
+            base, cap = self.delays.get(status, self.delays[ExecStatus.ENQUEUED])
+            delay = min(cap, base * self.factor ** (attempt - self.fastAttempts - 1))
+        delay *= random.uniform(1 - self.jitter, 1)
+        return timezone.timedelta(seconds=delay)
+
+
+class FallbackSchedule(PollingSchedule):
+    # Stretches another schedule when exec pushes results itself and polling only covers for lost callbacks
+
+    def __init__(self, schedule: PollingSchedule, minDelay: float):
+        self.schedule = schedule
+        self.minDelay = timezone.timedelta(seconds=minDelay)
+
+    def nextDelay(self, attempt: int, status: ExecStatus, failed: bool = False) -> timezone.timedelta:
+        return max(self.schedule.nextDelay(attempt, status, failed), self.minDelay)
+
+
+@functools.lru_cache(maxsize=None)
+def getPollingSchedule() -> PollingSchedule:
+    schedule = import_string(settings.EXEC_POLLING_SCHEDULE)(**settings.EXEC_POLLING_SCHEDULE_OPTIONS)
+    if settings.EXEC_WEBHOOK_URL:
+        schedule = FallbackSchedule(schedule, settings.EXEC_WEBHOOK_FALLBACK_POLL)
+    return schedule
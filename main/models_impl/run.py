@@ -1,6 +1,12 @@
 from __future__ import annotations
 
+import hashlib
+
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 from main.tools import exec_api as execApi
 from .abstract_run_result import AbstractRunResult
@@ -22,17 +28,90 @@ class RunResult(AbstractRunResult):
         )
 
 
+class RunBatch(models.Model):
+    # One submission run against a set of inputs
+    submission = models.ForeignKey(to=Submission, on_delete=models.CASCADE)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    def verdicts(self) -> Dict[str, int]:
+        rows = self.run_set.order_by().values('overallStatus').annotate(count=models.Count('id'))
+        return {row['overallStatus']: row['count'] for row in rows}
+
+
 class Run(AbstractExecRun):
     runResult = models.ForeignKey(to=RunResult, on_delete=models.CASCADE, null=True, blank=True)
     submission = models.ForeignKey(to=Submission, on_delete=models.CASCADE)
+    batch = models.ForeignKey(to=RunBatch, on_delete=models.CASCADE, null=True, blank=True)
+    # Identifies the binary, the input and the limits, runs with the same key are expected to behave the same
+    memoKey = models.CharField(max_length=64, blank=True, default='')
+
+    _resultField = 'runResult'
+
+    @staticmethod
+    def memoKeyFor(binaryId: str, input: Optional[bytes]) -> str:
+        return Run.memoKeyForChunks(binaryId, None if input is None else [input])
+
+    @staticmethod
+    def memoKeyForChunks(binaryId: str, chunks: Optional[Iterable[bytes]]) -> str:
+        # The same key, for an input read piece by piece
+        h = hashlib.sha256(binaryId.encode())
+        h.update(b'\0')
+        h.update(settings.EXEC_RUN_LIMITS_KEY.encode())
+        # No input and an empty input are different runs
+        if chunks is not None:
+            h.update(b'\0')
+            for chunk in chunks:
+                h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def findMemoized(keys: Iterable[str]) -> Dict[str, Run]:
+        # The newest successful original run for each of the keys that has one
+        if not settings.EXEC_RUN_MEMOIZE:
+            return {}
+        found = {}
+        for run in Run._reusable(settings.EXEC_RUN_REUSE_WINDOW, memoKey__in=set(keys)):
+            found.setdefault(run.memoKey, run)
+        return found
+
+    def reuseMemoized(self) -> bool:
+        # Saves the run as a copy of a memoized one, if there is one
+        original = Run.findMemoized([self.memoKey]).get(self.memoKey)
+        if original is None:
+            return False
+        self._reuse(original)
+        self.save()
+        return True
 
     def _getResult(self) -> AbstractRunResult:
         return self.runResult
 
-    def _updateFromOutcome(self, outcome):
-        self.runResult = RunResult.FromExec(outcome)
-        self.runResult.save()
+    def _setResult(self, result: RunResult):
+        self.runResult = result
+
+    @staticmethod
+    def _resultFromOutcome(outcome) -> RunResult:
+        return RunResult.FromExec(outcome)
 
     @staticmethod
     def _fetchStatusFromExec(id: str):
         return execApi.execApi.getRunStatus(id)
+
+    @staticmethod
+    def _fetchStatusesFromExec(ids: List[str]) -> Dict[str, execApi.RunStatus]:
+        return execApi.execApi.getRunStatuses(ids)
+
+    @staticmethod
+    async def _afetchStatusFromExec(id: str):
+        return await execApi.asyncExecApi.getRunStatus(id)
+
+    class Meta(AbstractExecRun.Meta):
+        indexes = AbstractExecRun.Meta.indexes + [
+            models.Index(fields=['submission', '-timestamp', '-id'], name='main_run_submission_ts'),
+            models.Index(fields=['batch', '-timestamp', '-id'], name='main_run_batch_ts'),
+            models.Index(
+                fields=['memoKey', '-timestamp'],
+                condition=models.Q(reusedFrom__isnull=True),
+                name='main_run_memo',
+            ),
+        ]
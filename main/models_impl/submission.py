@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+import hashlib
+
+from typing import Dict, List
+
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
@@ -27,20 +31,64 @@ class Submission(AbstractExecRun):
     sourceId = models.CharField(max_length=EXEC_ID_MAXLENGTH)
     compilationResult = models.ForeignKey(to=CompilationResult, on_delete=models.CASCADE, null=True, blank=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Byte-identical sources compiled with the same compiler settings share one compilation
+    sourceHash = models.CharField(max_length=64, blank=True, default='')
 
-    def _updateFromOutcome(self, outcome):
-        self.compilationResult = CompilationResult.FromExec(outcome)
-        self.compilationResult.save()
+    _resultField = 'compilationResult'
+
+    def _setResult(self, result: CompilationResult):
+        self.compilationResult = result
+
+    @staticmethod
+    def _resultFromOutcome(outcome) -> CompilationResult:
+        return CompilationResult.FromExec(outcome)
 
     @staticmethod
     def _fetchStatusFromExec(id: str):
         return execApi.execApi.getSubmissionStatus(id)
 
+    @staticmethod
+    def _fetchStatusesFromExec(ids: List[str]) -> Dict[str, execApi.CompilationStatus]:
+        return execApi.execApi.getSubmissionStatuses(ids)
+
+    @staticmethod
+    async def _afetchStatusFromExec(id: str):
+        return await execApi.asyncExecApi.getSubmissionStatus(id)
+
     def _getResult(self) -> AbstractRunResult:
         return self.compilationResult
 
+    @staticmethod
+    def hashSource(source: bytes) -> str:
+        h = hashlib.sha256(settings.EXEC_COMPILER_KEY.encode())
+        h.update(b'\0')
+        h.update(source)
+        return h.hexdigest()
+
+    def reuseCompilation(self) -> bool:
+        # Saves the submission as a copy of a recent successful compilation of the same source, if there is one
+        if not self.sourceHash:
+            return False
+        original = Submission._reusable(settings.EXEC_COMPILE_REUSE_WINDOW, sourceHash=self.sourceHash).first()
+        if original is None:
+            return False
+        self._reuse(original)
+        self.sourceId = original.sourceId
+        self.save()
+        return True
+
     def overallCompilationStatus(self) -> str:
-        status = self.overallStatus()
+        status = self.overallStatus
         if status == OverallRunStatus.RUNTIME_ERROR:
             return 'CE'
-        return status
+        return str(status)
+
+    class Meta(AbstractExecRun.Meta):
+        indexes = AbstractExecRun.Meta.indexes + [
+            models.Index(fields=['user', '-timestamp', '-id'], name='main_submission_user_ts'),
+            models.Index(
+                fields=['sourceHash', '-timestamp'],
+                condition=models.Q(reusedFrom__isnull=True),
+                name='main_submission_source',
+            ),
+        ]
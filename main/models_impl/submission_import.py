@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import itertools
+import time
+
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from main.tools.archives import ArchiveEntry, ArchiveError
+from .exec_job import ExecJob
+
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    reused: int = 0
+    rejected: List[Tuple[str, str]] = field(default_factory=list)  # (entry name, reason)
+    # Why the import stopped before the end of the archive, if it did
+    stopped: str = ''
+
+
+def importSubmissions(user, entries: Iterable[ArchiveEntry], progress: Optional[Callable[[ImportReport], None]] = None,
+                      waitWhenOverloaded=False) -> ImportReport:
+    # Saves the sources as submissions of `user` chunk by chunk, so that only one chunk is in memory at a time.
+    # While the queue to exec is full the import stops, or with waitWhenOverloaded waits for the dispatcher.
+    report = ImportReport()
+    entries = iter(entries)
+    while True:
+        try:
+            chunk = list(itertools.islice(entries, settings.EXEC_IMPORT_CHUNK_SIZE))
+        except ArchiveError as e:
+            report.stopped = str(e)
+            return report
+        if not chunk:
+            return report
+
+        report.rejected.extend((entry.name, entry.error) for entry in chunk if entry.error)
+        sources = [entry.source for entry in chunk if not entry.error]
+        while sources and ExecJob.isOverloaded(len(sources)):
+            if not waitWhenOverloaded:
+                report.stopped = "too many submissions are waiting for exec"
+                return report
+            time.sleep(settings.EXEC_QUEUE_INTERVAL)
+        if sources:
+            submissions = ExecJob.enqueueSubmissions(user, sources)
+            report.imported += len(submissions)
+            report.reused += sum(subm.reusedFrom_id is not None for subm in submissions)
+        if progress is not None:
+            progress(report)
@@ -1,3 +1,602 @@
-from django.test import TestCase
+import contextlib
+import gzip
+import hashlib
+import hmac
+import io
+import json
+import random
+import struct
+import tempfile
+import zipfile
 
-# Create your tests here.
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from main.models_impl import ExecJob, ExecStatus, Run, Submission
+from main.models_impl.polling import getPollingSchedule
+from main.tools import exec_api
+from main.tools.archives import ArchiveError, iterArchive
+from main.tools.artifact_cache import ArtifactCache, artifactCache
+from main.tools.fake_exec import FakeExec
+
+EXEC_TOKEN = 'exec-token'
+WEBHOOK_SECRET = 'webhook-secret'
+
+
+@override_settings(EXEC_API_TOKEN=EXEC_TOKEN, EXEC_WEBHOOK_SECRET=WEBHOOK_SECRET, EXEC_WEBHOOK_URL=None)
+class ExecTestCase(TestCase):
+    # Talks to a local fake exec, on which compilations and runs finish on their first status poll
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.exec = FakeExec(pollsUntilFinished=1, seed=0).start()
+        cls.cacheDir = tempfile.TemporaryDirectory()
+        cls.apis = (exec_api.execApi, exec_api.asyncExecApi)
+        cls.savedApis = [(api.url, api.token) for api in cls.apis]
+        cls.savedCacheDir = artifactCache.directory
+        for api in cls.apis:
+            api.url, api.token = cls.exec.url, EXEC_TOKEN
+        artifactCache.directory = Path(cls.cacheDir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        for api, (url, token) in zip(cls.apis, cls.savedApis):
+            api.url, api.token = url, token
+        artifactCache.directory = cls.savedCacheDir
+        cls.exec.stop()
+        cls.cacheDir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        # Exec ids start over with every fake exec, so nothing cached for them may survive a test
+        caches[settings.EXEC_STATUS_CACHE_ALIAS].clear()
+        exec_api.execCircuit.recordSuccess()
+        artifactCache.memory.clear()
+        artifactCache.memorySize = 0
+        self.user = User.objects.create_user('user', password='password')
+        self.client.force_login(self.user)
+
+    def submit(self, source: bytes, poll=True) -> Submission:
+        subm = Submission(user=self.user, sourceHash=Submission.hashSource(source))
+        ExecJob.enqueueSubmission(subm, source).dispatch()
+        if poll:
+            Submission.tryUpdateAll()
+        return Submission.objects.get(pk=subm.pk)
+
+    def startRun(self, subm: Submission) -> Run:
+        binaryId = subm.compilationResult.binaryId
+        run = Run(submission=subm, memoKey=Run.memoKeyFor(binaryId, None))
+        ExecJob.enqueueRun(run, binaryId).dispatch()
+        Run.tryUpdateAll()
+        return Run.objects.get(pk=run.pk)
+
+
+class ListQueriesTest(ExecTestCase):
+    # Pages cost the same number of queries however many rows they show:
+    # the session, the user, and one per list or object on the page
+
+    def populate(self, count: int) -> Submission:
+        for i in range(count):
+            subm = self.submit(f'int main() {{ return {i}; }}'.encode())
+            self.assertEqual(subm.execStatus, ExecStatus.FINISHED)
+            self.startRun(subm)
+        return subm
+
+    def assertConstantQueries(self, path, queries: int):
+        for count in (1, 10):
+            with self.subTest(rows=count):
+                Run.objects.all().delete()
+                Submission.objects.all().delete()
+                subm = self.populate(count)
+                with self.assertNumQueries(queries):
+                    resp = self.client.get(path(subm))
+                self.assertEqual(resp.status_code, 200)
+
+    def testSubmissionsList(self):
+        self.assertConstantQueries(lambda subm: '/submissions', 3)
+
+    def testRunsList(self):
+        self.assertConstantQueries(lambda subm: '/runs', 3)
+
+    def testSubmissionPage(self):
+        # Every submission has one run; the last one's page lists it
+        self.assertConstantQueries(lambda subm: f'/submission/{subm.pk}', 4)
+
+    def testSubmissionPageWithManyRuns(self):
+        subm = self.populate(1)
+        for count in (1, 10):
+            with self.subTest(runs=count):
+                while subm.run_set.count() < count:
+                    self.startRun(subm)
+                with self.assertNumQueries(4):
+                    resp = self.client.get(f'/submission/{subm.pk}')
+                self.assertEqual(resp.status_code, 200)
+
+
+class IndexUsageTest(TestCase):
+    # The hot queries have to be served by their index; a few rows are enough for the planner to pick it
+
+    def setUp(self):
+        self.user = User.objects.create_user('user', password='password')
+        now = timezone.now()
+        for i in range(50):
+            Submission.objects.create(
+                user=self.user, execId=f'c{i}', sourceId=f'src-c{i}',
+                nextCheck=now if i % 2 else None, timestamp=now - timezone.timedelta(seconds=i),
+            )
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index: str):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+
+    def fieldIndex(self, model, column: str) -> str:
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+        return next(name for name, c in constraints.items() if c['index'] and c['columns'] == [column])
+
+    def testDueRows(self):
+        for model in (Submission, Run):
+            with self.subTest(model=model.__name__):
+                due = model.objects.filter(nextCheck__lte=timezone.now()).order_by('nextCheck')[:100]
+                self.assertUsesIndex(due, f'main_{model._meta.model_name}_due')
+
+    def testSubmissionsOfUser(self):
+        self.assertUsesIndex(self.user.submission_set.order_by('-timestamp', '-id')[:20], 'main_submission_user_ts')
+
+    def testRunsOfSubmission(self):
+        subm = Submission.objects.first()
+        self.assertUsesIndex(subm.run_set.order_by('-timestamp', '-id')[:20], 'main_run_submission_ts')
+
+    def testExecId(self):
+        for model in (Submission, Run):
+            with self.subTest(model=model.__name__):
+                self.assertUsesIndex(model.objects.filter(execId='c7'), self.fieldIndex(model, 'execId'))
+
+
+class PollingTest(TestCase):
+    def testFailureBackoffIgnoresPolls(self):
+        # A row that has been running for a while is retried soon after its first failed poll
+        schedule = getPollingSchedule()
+        subm = Submission(execStatus=ExecStatus.RUNNING, pollAttempts=10)
+        subm._scheduleNextCheck(failed=True)
+        self.assertLessEqual(subm.nextCheck - timezone.now(), timezone.timedelta(seconds=schedule.failureDelay))
+        self.assertEqual(subm.pollFailures, 1)
+        self.assertEqual(subm.pollAttempts, 10)
+
+    def testSuccessResetsFailures(self):
+        subm = Submission(execStatus=ExecStatus.RUNNING, pollFailures=5)
+        subm._applyStatus(exec_api.CompilationStatus(exec_api.ExecStatus.PROCESSING, None), save=False)
+        self.assertEqual(subm.pollFailures, 0)
+
+
+class ExecCallbackTest(ExecTestCase):
+    def setUp(self):
+        super().setUp()
+        self.subm = self.submit(b'int main() {}', poll=False)
+
+    def finished(self, subm: Submission) -> bytes:
+        status = self.exec.status('compile', subm.execId)
+        return json.dumps({**status, 'type': 'compile', 'id': subm.execId}).encode()
+
+    def post(self, body: bytes, **headers):
+        return self.client.post('/exec/callback', body, content_type='application/json', **headers)
+
+    @staticmethod
+    def signature(body: bytes) -> str:
+        return 'sha256=' + hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+    def assertFinished(self):
+        self.subm.refresh_from_db()
+        self.assertEqual(self.subm.execStatus, ExecStatus.FINISHED)
+        self.assertIsNone(self.subm.nextCheck)
+        self.assertIsNotNone(self.subm.compilationResult)
+
+    def testToken(self):
+        resp = self.post(self.finished(self.subm), HTTP_X_EXEC_TOKEN=EXEC_TOKEN)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), {'updated': 1})
+        self.assertFinished()
+
+    def testSignature(self):
+        body = self.finished(self.subm)
+        resp = self.post(body, HTTP_X_EXEC_SIGNATURE=self.signature(body))
+        self.assertEqual(resp.status_code, 200)
+        self.assertFinished()
+
+    def testBadSignature(self):
+        body = self.finished(self.subm)
+        for headers in ({'HTTP_X_EXEC_SIGNATURE': self.signature(body + b' ')}, {'HTTP_X_EXEC_TOKEN': 'wrong'}, {}):
+            with self.subTest(headers=headers):
+                self.assertEqual(self.post(body, **headers).status_code, 403)
+        self.subm.refresh_from_db()
+        self.assertEqual(self.subm.execStatus, ExecStatus.ENQUEUED)
+
+    def testMalformed(self):
+        bodies = (
+            b'not json',
+            json.dumps({'type': 'compile'}).encode(),
+            json.dumps({'type': 'link', 'id': self.subm.execId, 'status': 'finished'}).encode(),
+            json.dumps({'type': 'compile', 'id': self.subm.execId, 'status': 'lost'}).encode(),
+        )
+        for body in bodies:
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body, HTTP_X_EXEC_TOKEN=EXEC_TOKEN).status_code, 400)
+        self.subm.refresh_from_db()
+        self.assertEqual(self.subm.execStatus, ExecStatus.ENQUEUED)
+
+    def testCallbackWinsOverClaimedPoll(self):
+        # The poller claims the row and asks exec, the callback arrives before the poller writes back
+        owner, rows = Submission._claimDue()
+        self.assertEqual([row.pk for row in rows], [self.subm.pk])
+        self.assertEqual(self.post(self.finished(self.subm), HTTP_X_EXEC_TOKEN=EXEC_TOKEN).status_code, 200)
+        self.exec.pollsUntilFinished = 10  # The poller saw an older status
+        try:
+            Submission._updateChunk(rows, owner)
+        finally:
+            self.exec.pollsUntilFinished = 1
+        self.assertFinished()
+        self.assertEqual(self.subm.claimedBy, '')
+
+
+@override_settings(EXEC_RUN_MEMOIZE=True)
+class MemoizedRunTest(ExecTestCase):
+    def setUp(self):
+        super().setUp()
+        self.subm = self.submit(b'int main() {}')
+        self.original = self.startRun(self.subm)
+
+    def createRun(self, **data) -> Run:
+        resp = self.client.post(f'/createRun/{self.subm.pk}', data)
+        self.assertEqual(resp.status_code, 302)
+        return Run.objects.latest('pk')
+
+    def testReused(self):
+        self.assertEqual(self.createRun().reusedFrom_id, self.original.pk)
+
+    def testBenchmarkExecutes(self):
+        run = self.createRun(benchmark='1')
+        self.assertIsNone(run.reusedFrom_id)
+        self.assertTrue(ExecJob.objects.filter(run=run).exists())
+
+    def testPlayButtonExecutes(self):
+        page = self.client.get('/submissions').content.decode()
+        self.assertIn('name="benchmark" value="1"', page)
+
+
+class ArtifactCacheTest(SimpleTestCase):
+    # Several seek steps of content that compresses about as well as program output
+    CONTENT = b''.join(f'{i} {i * i} {hashlib.md5(str(i).encode()).hexdigest()}\n'.encode() for i in range(100000))
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.cache = ArtifactCache(self.directory.name, memoryLimit=1 << 20, diskLimit=1 << 30, smallThreshold=1 << 16)
+
+    def store(self, id: str, content: bytes):
+        writer = self.cache.writer(id)
+        for i in range(0, len(content), 10007):  # Chunks that don't line up with the seek steps
+            writer.write(content[i:i + 10007])
+        file, size = writer.commit()
+        file.close()
+        self.assertEqual(size, len(content))
+
+    def testRoundTrip(self):
+        for id, content in (('empty', b''), ('small', self.CONTENT[:1000]), ('large', self.CONTENT)):
+            with self.subTest(id=id):
+                self.store(id, content)
+                file, size = self.cache.open(id)
+                with file:
+                    self.assertEqual(size, len(content))
+                    self.assertEqual(file.read(), content)
+                    self.assertEqual(file.read(), b'')
+
+    def testSeek(self):
+        self.store('large', self.CONTENT)
+        rng = random.Random(0)
+        file, size = self.cache.open('large')
+        with file:
+            # Forwards, backwards, within a step and across steps
+            for _ in range(30):
+                first, length = rng.randrange(size), rng.randrange(1, 1 << 18)
+                self.assertEqual(file.seek(first), first)
+                self.assertEqual(file.read(length), self.CONTENT[first:first + length])
+            self.assertEqual(file.seek(-10, io.SEEK_END), size - 10)
+            self.assertEqual(file.read(), self.CONTENT[-10:])
+
+    def testCompressedIsGzip(self):
+        for id, content in (('small', self.CONTENT[:1000]), ('large', self.CONTENT)):
+            with self.subTest(id=id):
+                self.store(id, content)
+                file, _ = self.cache.open(id)
+                compressed = file.detachCompressed()
+                try:
+                    self.assertEqual(gzip.decompress(compressed.read(file.compressedSize)), content)
+                finally:
+                    compressed.close()
+
+    def testEvictedWhileOpening(self):
+        self.store('large', self.CONTENT)
+        with mock.patch('main.tools.artifact_cache.os.utime', side_effect=FileNotFoundError):
+            self.assertIsNone(self.cache.open('large'))
+        self.assertEqual(self.cache.misses, 1)
+
+
+class StatusParseTest(SimpleTestCase):
+    STATS = (
+        "time.wall: 1500000\n"
+        "time.cpu.total: 1200000\n"
+        "time.cpu.user: 1000000\n"
+        "time.cpu.system: 200000\n"
+        "memory.max: 67108864\n"
+        "status: signaled 9\n"
+        "verdict: TL\n"
+        "io.read: 4096\n"  # Unknown keys are skipped
+    )
+
+    def testRun(self):
+        payload = {'status': 'finished', 'stdout-id': 'o', 'stderr-id': 'e', 'stats': self.STATS}
+        status = exec_api.RunStatus.FromExec(payload)
+        self.assertEqual(status, exec_api.RunStatus(
+            execStatus=exec_api.ExecStatus.FINISHED,
+            outcome=exec_api.RunOutcome(stdoutId='o', stderrId='e', statistics=exec_api.Statistics(
+                wallTime=timezone.timedelta(seconds=1.5),
+                cpuTotalTime=timezone.timedelta(seconds=1.2),
+                cpuUserTime=timezone.timedelta(seconds=1),
+                cpuSystemTime=timezone.timedelta(seconds=0.2),
+                maxMemory=64 << 20,
+                exitStatus=exec_api.ExitStatus(code=9, type=exec_api.ExitStatus.Type.SIGNALED),
+                verdict='TL',
+            )),
+        ))
+
+    def testPending(self):
+        status = exec_api.CompilationStatus.FromExec({'status': 'processing'})
+        self.assertEqual(status, exec_api.CompilationStatus(exec_api.ExecStatus.PROCESSING, None))
+
+    def testMalformed(self):
+        for stats in (
+            self.STATS.replace('verdict: TL\n', ''),
+            self.STATS + 'verdict: OK\n',
+            self.STATS.replace('memory.max: ', 'memory.max '),
+            self.STATS.replace('signaled', 'vanished'),
+        ):
+            with self.subTest(stats=stats):
+                with self.assertRaises(ValueError):
+                    exec_api.Statistics.FromExec(stats)
+
+
+class ArchivesTest(SimpleTestCase):
+    SOURCE = b'int main() { return 0; }\n' * 100
+
+    def brokenZip(self) -> io.BytesIO:
+        # A readable member, one compressed with Deflate64, which zipfile can't inflate, and a corrupt one
+        file = io.BytesIO()
+        with zipfile.ZipFile(file, 'w') as archive:
+            archive.writestr('ok.cpp', self.SOURCE, zipfile.ZIP_DEFLATED)
+            archive.writestr('deflate64.cpp', self.SOURCE, zipfile.ZIP_STORED)
+            archive.writestr('corrupt.cpp', self.SOURCE, zipfile.ZIP_DEFLATED)
+            infos = {info.filename: info for info in archive.infolist()}
+        data = bytearray(file.getvalue())
+        local = infos['deflate64.cpp'].header_offset
+        central = data.index(b'deflate64.cpp', local + 30 + len('deflate64.cpp')) - 46
+        struct.pack_into('<H', data, local + 8, 9)
+        struct.pack_into('<H', data, central + 10, 9)
+        corrupt = infos['corrupt.cpp']
+        start = corrupt.header_offset + 30 + len(corrupt.filename) + len(corrupt.extra)
+        data[start:start + 8] = b'\xff' * 8
+        return io.BytesIO(bytes(data))
+
+    def testUnreadableEntries(self):
+        entries = {entry.name: entry for entry in iterArchive(self.brokenZip(), 1 << 16, 100)}
+        self.assertEqual(entries['ok.cpp'].source, self.SOURCE)
+        self.assertEqual(entries['ok.cpp'].error, '')
+        self.assertIsNone(entries['deflate64.cpp'].source)
+        self.assertIn('unsupported', entries['deflate64.cpp'].error)
+        self.assertIsNone(entries['corrupt.cpp'].source)
+        self.assertIn('corrupt', entries['corrupt.cpp'].error)
+
+    def testBrokenArchive(self):
+        with self.assertRaises(ArchiveError):
+            list(iterArchive(io.BytesIO(b'neither a zip nor a tar'), 1 << 16, 100))
+
+
+class ArtifactViewTest(ExecTestCase):
+    def setUp(self):
+        super().setUp()
+        run = self.startRun(self.submit(b'int main() {}'))
+        self.path = f'/run/{run.pk}/stdout'
+        self.content = self.exec.artifact(run.runResult.stdoutId)
+
+    def get(self, **headers):
+        resp = self.client.get(self.path, **headers)
+        body = b''.join(resp.streaming_content) if resp.streaming else resp.content
+        return resp, body
+
+    def testWhole(self):
+        resp, body = self.get()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(resp['Content-Length'], str(len(self.content)))
+        self.assertFalse(resp.has_header('Content-Encoding'))
+
+    def testRange(self):
+        size = len(self.content)
+        ranges = (
+            ('bytes=10-19', 10, 19),
+            ('bytes=-5', size - 5, size - 1),
+            (f'bytes={size - 3}-', size - 3, size - 1),
+            (f'bytes=0-{size * 2}', 0, size - 1),
+        )
+        for header, first, last in ranges:
+            with self.subTest(range=header):
+                resp, body = self.get(HTTP_RANGE=header)
+                self.assertEqual(resp.status_code, 206)
+                self.assertEqual(resp['Content-Range'], f'bytes {first}-{last}/{size}')
+                self.assertEqual(body, self.content[first:last + 1])
+
+    def testIgnoredRange(self):
+        # Invalid or several ranges, or a validator that doesn't match, get the whole artifact
+        for headers in ({'HTTP_RANGE': 'bytes=5-2'}, {'HTTP_RANGE': 'bytes=0-1,5-6'},
+                        {'HTTP_RANGE': 'bytes=0-1', 'HTTP_IF_RANGE': '"other"'}):
+            with self.subTest(headers=headers):
+                resp, body = self.get(**headers)
+                self.assertEqual(resp.status_code, 200)
+                self.assertEqual(body, self.content)
+
+    def testUnsatisfiableRange(self):
+        resp, _ = self.get(HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(resp.status_code, 416)
+        self.assertEqual(resp['Content-Range'], f'bytes */{len(self.content)}')
+
+    def testNotModified(self):
+        for encoding in ('', 'gzip'):
+            with self.subTest(encoding=encoding):
+                resp, _ = self.get(HTTP_ACCEPT_ENCODING=encoding)
+                resp, body = self.get(HTTP_ACCEPT_ENCODING=encoding, HTTP_IF_NONE_MATCH=resp['ETag'])
+                self.assertEqual(resp.status_code, 304)
+                self.assertEqual(body, b'')
+
+    def testGzip(self):
+        resp, body = self.get(HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        self.assertEqual(resp['Content-Length'], str(len(body)))
+        self.assertEqual(gzip.decompress(body), self.content)
+        plain, _ = self.get()
+        self.assertNotEqual(resp['ETag'], plain['ETag'])
+
+    def testGzipRefused(self):
+        resp, body = self.get(HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertFalse(resp.has_header('Content-Encoding'))
+        self.assertEqual(body, self.content)
+
+
+class ExecJobTest(ExecTestCase):
+    def enqueue(self) -> Submission:
+        subm = Submission(user=self.user, sourceHash=Submission.hashSource(b'int main() {}'))
+        ExecJob.enqueueSubmission(subm, b'int main() {}')
+        return subm
+
+    @contextlib.contextmanager
+    def failing(self):
+        # Every request fails with 503 until the block ends
+        self.exec.failureRate = 1.0
+        try:
+            yield
+        finally:
+            self.exec.failureRate = 0.0
+
+    def testClaimOnce(self):
+        self.enqueue()
+        jobs = ExecJob.claim(10)
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(jobs[0].state, ExecJob.State.DISPATCHING)
+        self.assertEqual(ExecJob.claim(10), [])
+        # A dispatcher that died leaves the job to others once the lease is over
+        ExecJob.objects.update(leaseUntil=timezone.now() - timezone.timedelta(seconds=1))
+        self.assertEqual([job.pk for job in ExecJob.claim(10)], [jobs[0].pk])
+
+    def testDeliver(self):
+        subm = self.enqueue()
+        ExecJob.claim(10)[0].dispatch()
+        self.assertFalse(ExecJob.objects.exists())
+        subm.refresh_from_db()
+        self.assertNotEqual(subm.execId, '')
+        self.assertIsNotNone(subm.nextCheck)
+
+    def testRetry(self):
+        subm = self.enqueue()
+        with self.failing():
+            ExecJob.claim(10)[0].dispatch()
+        job = ExecJob.objects.get()
+        self.assertEqual(job.state, ExecJob.State.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.nextAttempt, timezone.now())
+        self.assertIn('503', job.lastError)
+        self.assertNotIn(EXEC_TOKEN, job.lastError)
+        self.assertEqual(ExecJob.claim(10), [])  # Not due before its next attempt
+        subm.refresh_from_db()
+        self.assertEqual(subm.execStatus, ExecStatus.ENQUEUED)
+
+    @override_settings(EXEC_QUEUE_MAX_ATTEMPTS=1)
+    def testFail(self):
+        subm = self.enqueue()
+        with self.failing():
+            ExecJob.claim(10)[0].dispatch()
+        job = ExecJob.objects.get()
+        self.assertEqual(job.state, ExecJob.State.FAILED)
+        self.assertIsNone(job.payload)
+        subm.refresh_from_db()
+        self.assertEqual(subm.execStatus, ExecStatus.FAILED)
+        self.assertIsNone(subm.nextCheck)
+
+    def testTargetDeleted(self):
+        subm = self.enqueue()
+        job = ExecJob.claim(10)[0]
+        subm.delete()
+        with self.failing():
+            job.dispatch()
+        self.assertFalse(ExecJob.objects.exists())
+
+
+class EventsTest(ExecTestCase):
+    # The test client is a WSGI one, which gets the current statuses and polls rather than a stream
+
+    def testPollWhilePending(self):
+        subm = self.submit(b'int main() {}', poll=False)
+        resp = self.client.get(f'/events?submission={subm.pk}')
+        self.assertFalse(resp.streaming)
+        self.assertEqual(resp['Content-Type'], 'text/event-stream')
+        body = resp.content.decode()
+        self.assertIn('event: submission\n', body)
+        self.assertIn('"finished": false', body)
+        self.assertIn('retry: ', body)
+        self.assertNotIn('event: done', body)
+
+    def testDoneOnceFinished(self):
+        subm = self.submit(b'int main() {}')
+        body = self.client.get(f'/events?submission={subm.pk}').content.decode()
+        self.assertIn('"finished": true', body)
+        self.assertIn('event: done', body)
+        self.assertNotIn('retry: ', body)
+
+    @override_settings(EXEC_EVENTS_MAX_DURATION=0)
+    async def testStreamUnderAsgi(self):
+        subm = await sync_to_async(self.submit)(b'int main() {}', poll=False)
+        await sync_to_async(self.async_client.force_login)(self.user)
+        resp = await self.async_client.get(f'/events?submission={subm.pk}')
+        self.assertTrue(resp.streaming)
+        body = ''.join([chunk.decode() async for chunk in resp.streaming_content])
+        self.assertIn('"finished": false', body)
+        self.assertNotIn('retry: ', body)
+
+    @override_settings(EXEC_EVENTS_MAX_STREAMS=0)
+    async def testPollPastMaxStreams(self):
+        subm = await sync_to_async(self.submit)(b'int main() {}', poll=False)
+        await sync_to_async(self.async_client.force_login)(self.user)
+        resp = await self.async_client.get(f'/events?submission={subm.pk}')
+        self.assertFalse(resp.streaming)
+        self.assertIn('retry: ', resp.content.decode())
+
+
+class AsyncExecApiTest(ExecTestCase):
+    def testPooledUnderWsgi(self):
+        # Every WSGI request has an event loop of its own, which must not get an AsyncClient of its own
+        subm = self.submit(b'int main() {}', poll=False)
+        requests = sum(self.exec.requests.values())
+        for _ in range(3):
+            self.assertEqual(self.client.get(f'/submission/{subm.pk}').status_code, 200)
+        self.assertGreater(sum(self.exec.requests.values()), requests)
+        self.assertEqual(len(exec_api.asyncExecApi._clients), 0)
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import lzma
+import os
+import tarfile
+import zipfile
+import zlib
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+READ_CHUNK_SIZE = 64 << 10
+
+
+class ArchiveError(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class ArchiveEntry:
+    name: str
+    source: Optional[bytes]
+    # Why the entry was rejected, if it was
+    error: str = ''
+
+
+def _readLimited(file: BinaryIO, limit: int) -> Optional[bytes]:
+    # Reads at most limit + 1 bytes whatever the archive claims the size is; None if the file is larger than limit
+    chunks, size = [], 0
+    while size <= limit:
+        chunk = file.read(min(READ_CHUNK_SIZE, limit + 1 - size))
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+        size += len(chunk)
+    return None
+
+
+def _isHidden(name: str) -> bool:
+    # Dotfiles and the metadata macOS puts into zips
+    return any(part.startswith('.') or part == '__MACOSX' for part in Path(name).parts)
+
+
+def _entry(name: str, file: BinaryIO, maxBytes: int) -> ArchiveEntry:
+    source = _readLimited(file, maxBytes)
+    if source is None:
+        return ArchiveEntry(name, None, f"larger than {maxBytes} bytes")
+    return ArchiveEntry(name, source)
+
+
+def iterArchive(file: BinaryIO, maxBytes: int, maxEntries: int) -> Iterator[ArchiveEntry]:
+    # Yields the regular files of a zip or a (compressed) tar one at a time, without extracting it.
+    # Files over maxBytes are yielded with an error instead of their content, files past maxEntries not at all.
+    try:
+        if zipfile.is_zipfile(file):
+            file.seek(0)
+            yield from _iterZip(file, maxBytes, maxEntries)
+        else:
+            file.seek(0)
+            yield from _iterTar(file, maxBytes, maxEntries)
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError, zlib.error, lzma.LZMAError) as e:
+        raise ArchiveError(f"Broken archive: {e}") from e
+
+
+def _iterZip(file: BinaryIO, maxBytes: int, maxEntries: int) -> Iterator[ArchiveEntry]:
+    with zipfile.ZipFile(file) as archive:
+        entries = [info for info in archive.infolist() if not info.is_dir() and not _isHidden(info.filename)]
+        for info in entries[:maxEntries]:
+            if info.flag_bits & 0x1:
+                yield ArchiveEntry(info.filename, None, "encrypted")
+                continue
+            try:
+                with archive.open(info) as entry:
+                    parsed = _entry(info.filename, entry, maxBytes)
+            except NotImplementedError as e:
+                # Compression methods zipfile lacks, such as Deflate64 of Windows-made zips
+                parsed = ArchiveEntry(info.filename, None, f"unsupported: {e}")
+            except (zipfile.BadZipFile, EOFError, zlib.error) as e:
+                # Zip members are compressed one by one, so a corrupt one leaves the others readable
+                parsed = ArchiveEntry(info.filename, None, f"corrupt: {e}")
+            yield parsed
+
+
+def _iterTar(file: BinaryIO, maxBytes: int, maxEntries: int) -> Iterator[ArchiveEntry]:
+    # Stream mode reads members in order and never seeks back, so compressed tars are decompressed once
+    with tarfile.open(fileobj=file, mode='r|*') as archive:
+        count = 0
+        for member in archive:
+            if not member.isfile() or _isHidden(member.name):
+                continue
+            if count == maxEntries:
+                return
+            count += 1
+            yield _entry(member.name, archive.extractfile(member), maxBytes)
+
+
+def iterDirectory(directory: Path, maxBytes: int, maxEntries: int) -> Iterator[ArchiveEntry]:
+    # The same for the files under a directory, in name order; symlinks are not followed
+    count = 0
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not _isHidden(d))
+        for name in sorted(files):
+            path = Path(root) / name
+            if _isHidden(name) or path.is_symlink() or not path.is_file():
+                continue
+            if count == maxEntries:
+                return
+            count += 1
+            with open(path, 'rb') as file:
+                yield _entry(str(path.relative_to(directory)), file, maxBytes)
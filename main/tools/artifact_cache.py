@@ -0,0 +1,367 @@
+from __future__ import annotations
+
+import bisect
+import hashlib
+import io
+import logging
+import math
+import os
+import struct
+import tempfile
+import threading
+import zlib
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Blobs are stored as a header, the gzip of the content, which is served to browsers as is, and a seek index.
+# The gzip is fully flushed every _SEEK_STEP bytes of content, so inflating can start over at each of those points
+# and reading from any offset inflates at most one step, however large the artifact is.
+_HEADER = struct.Struct('>QQ')  # content size, gzip size
+_POINT = struct.Struct('>QQ')  # offset in the content, offset in the gzip where inflating can start
+_SEEK_STEP = 1 << 20
+# No name, mtime or flags; the deflate stream after it is written raw, see ArtifactWriter
+_GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+_GZIP_TRAILER = struct.Struct('<II')  # crc32, size mod 2**32
+# Output of a decompressor per step, so that a small chunk of a huge stream doesn't inflate all at once
+_INFLATE_STEP = 1 << 20
+_READ_SIZE = 64 << 10
+
+
+class _Window:
+    # The part of a file after its header, as a file of its own
+
+    def __init__(self, file: BinaryIO, offset: int):
+        self.file = file
+        self.offset = offset
+        file.seek(offset)
+
+    def read(self, size=-1) -> bytes:
+        return self.file.read(size)
+
+    def seek(self, position: int, whence=io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position += self.offset
+        return self.file.seek(position, whence) - self.offset
+
+    def tell(self) -> int:
+        return self.file.tell() - self.offset
+
+    def close(self):
+        self.file.close()
+
+
+class ArtifactFile:
+    # Reads a stored blob as its content, seeking through the index; detachCompressed gives its gzip instead
+
+    def __init__(self, file: BinaryIO, storedSize: int):
+        self.file = file
+        self.contentSize, self.compressedSize = _HEADER.unpack(file.read(_HEADER.size))
+        file.seek(_HEADER.size + self.compressedSize)
+        index = file.read(storedSize - _HEADER.size - self.compressedSize)
+        self.points = list(_POINT.iter_unpack(index))
+        self.position = 0
+        self.decompressor = None
+        self.compressedLeft = 0  # of the deflate stream after the file position
+
+    def __enter__(self) -> ArtifactFile:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, position: int, whence=io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            position += self.position
+        elif whence == io.SEEK_END:
+            position += self.contentSize
+        position = max(0, min(position, self.contentSize))
+        i = bisect.bisect_right(self.points, (position, math.inf)) - 1
+        if self.decompressor is None or position < self.position or self.points[i][0] > self.position:
+            self._restart(*self.points[i])
+        while self.position < position:
+            self._inflate(min(position - self.position, _INFLATE_STEP))
+        return self.position
+
+    def read(self, size=-1) -> bytes:
+        left = self.contentSize - self.position
+        size = left if size is None or size < 0 else min(size, left)
+        if self.decompressor is None:
+            self._restart(*self.points[0])
+        chunks = []
+        while size > 0:
+            chunk = self._inflate(min(size, _INFLATE_STEP))
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def _restart(self, contentOffset: int, compressedOffset: int):
+        self.file.seek(_HEADER.size + compressedOffset)
+        self.compressedLeft = self.compressedSize - compressedOffset
+        self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        self.position = contentOffset
+
+    def _inflate(self, limit: int) -> bytes:
+        while True:
+            data = self.decompressor.unconsumed_tail
+            if not data:
+                data = self.file.read(min(_READ_SIZE, self.compressedLeft))
+                self.compressedLeft -= len(data)
+            if not data or self.decompressor.eof:
+                raise EOFError(f"Artifact ends at {self.position} of {self.contentSize} bytes")
+            chunk = self.decompressor.decompress(data, limit)
+            if chunk:
+                self.position += len(chunk)
+                return chunk
+
+    def detachCompressed(self) -> BinaryIO:
+        # The caller owns the returned file from then on, and this one can't be read anymore.
+        # Only the first compressedSize bytes of it are the gzip.
+        file, self.file = self.file, None
+        return _Window(file, _HEADER.size)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def _opened(file: BinaryIO, storedSize: int) -> Tuple[ArtifactFile, int]:
+    artifact = ArtifactFile(file, storedSize)
+    return artifact, artifact.contentSize
+
+
+class ArtifactCache:
+    # Exec artifacts never change once created, so they can be cached by id forever and only evicted for space.
+    # Small blobs are kept in memory, larger ones on disk; both tiers are LRU bounded by their total size.
+    # Blobs are kept compressed, so sizes and limits are those of the compressed form.
+
+    def __init__(self, directory=None, memoryLimit=0, diskLimit=0, smallThreshold=0, compressionLevel=6):
+        self.directory = Path(directory) if directory else None
+        self.memoryLimit = memoryLimit
+        self.diskLimit = diskLimit
+        self.smallThreshold = smallThreshold
+        self.compressionLevel = compressionLevel
+
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.memorySize = 0
+        self.diskSize = None  # Unknown until the directory is scanned
+
+        self.memoryHits = 0
+        self.diskHits = 0
+        self.misses = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memoryHits + self.diskHits
+
+    def open(self, id: str) -> Optional[Tuple[ArtifactFile, int]]:
+        # Returns the cached blob as a file positioned at the start, along with its size
+        with self.lock:
+            blob = self.memory.get(id)
+            if blob is not None:
+                self.memory.move_to_end(id)
+                self.memoryHits += 1
+                return _opened(io.BytesIO(blob), len(blob))
+
+        if self.directory is not None:
+            path = self._path(id)
+            try:
+                file = open(path, 'rb')
+            except FileNotFoundError:
+                pass
+            else:
+                try:
+                    os.utime(path)  # The modification time is the recency for eviction
+                except FileNotFoundError:
+                    # Evicted meanwhile, possibly by another process, which makes it a miss
+                    file.close()
+                else:
+                    with self.lock:
+                        self.diskHits += 1
+                    return _opened(file, os.fstat(file.fileno()).st_size)
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def writer(self, id: str) -> ArtifactWriter:
+        return ArtifactWriter(self, id)
+
+    def _putToMemory(self, id: str, blob: bytes):
+        if len(blob) > self.memoryLimit:
+            return
+        with self.lock:
+            old = self.memory.pop(id, None)
+            if old is not None:
+                self.memorySize -= len(old)
+            self.memory[id] = blob
+            self.memorySize += len(blob)
+            while self.memorySize > self.memoryLimit:
+                _, evicted = self.memory.popitem(last=False)
+                self.memorySize -= len(evicted)
+
+    def _accountDisk(self, size: int):
+        with self.lock:
+            if self.diskSize is not None:
+                self.diskSize += size
+            needsEviction = self.diskSize is None or self.diskSize > self.diskLimit
+        if needsEviction:
+            self._evictFromDisk()
+
+    def _evictFromDisk(self):
+        # Other processes share the directory, so the real size is only known after a scan
+        entries = []
+        for path in self.directory.glob('*/*'):
+            if path.name.startswith('.tmp-'):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        # Free a bit more than needed, so that the scan doesn't happen on every put
+        target = self.diskLimit * 9 // 10
+        entries.sort()
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+        with self.lock:
+            self.diskSize = total
+
+    def _path(self, id: str) -> Path:
+        # Ids come from exec and are not necessarily safe file names
+        digest = hashlib.sha256(id.encode()).hexdigest()
+        return self.directory / digest[:2] / digest
+
+    def stats(self):
+        with self.lock:
+            return dict(
+                memoryHits=self.memoryHits,
+                diskHits=self.diskHits,
+                misses=self.misses,
+                memoryEntries=len(self.memory),
+                memoryBytes=self.memorySize,
+            )
+
+
+class ArtifactWriter:
+    # Receives the content of a blob chunk by chunk without holding it in memory, compresses it, and stores the
+    # blob in the fitting tier on commit. Blobs too large for the cache still end up in a temporary file,
+    # so the caller can always read them back.
+
+    def __init__(self, cache: ArtifactCache, id: str):
+        self.cache = cache
+        self.id = id
+        self.size = 0  # of the stored blob
+        self.buffer = io.BytesIO()
+        self.file = None
+        self.path = None
+        # Raw deflate, so that the gzip framing and the flush points are under our control
+        self.compressor = zlib.compressobj(cache.compressionLevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.crc = 0
+        self.contentSize = 0
+        self.compressedSize = 0
+        self.points = [(0, len(_GZIP_HEADER))]
+        self._store(_HEADER.pack(0, 0))  # The sizes are filled in on commit
+        self._storeCompressed(_GZIP_HEADER)
+
+    def write(self, chunk: bytes):
+        chunk = memoryview(chunk)
+        while chunk:
+            nextPoint = self.points[-1][0] + _SEEK_STEP
+            part, chunk = chunk[:nextPoint - self.contentSize], chunk[nextPoint - self.contentSize:]
+            self.crc = zlib.crc32(part, self.crc)
+            self.contentSize += len(part)
+            self._storeCompressed(self.compressor.compress(part))
+            if self.contentSize == nextPoint:
+                self._storeCompressed(self.compressor.flush(zlib.Z_FULL_FLUSH))
+                self.points.append((self.contentSize, self.compressedSize))
+
+    def _storeCompressed(self, data: bytes):
+        self.compressedSize += len(data)
+        self._store(data)
+
+    def _store(self, data: bytes):
+        self.size += len(data)
+        if self.file is None and self.size > self.cache.smallThreshold:
+            self._spill()
+        (self.file or self.buffer).write(data)
+
+    def _spill(self):
+        if self.cache.directory is not None:
+            self.cache.directory.mkdir(parents=True, exist_ok=True)
+            fd, self.path = tempfile.mkstemp(dir=self.cache.directory, prefix='.tmp-')
+            self.file = os.fdopen(fd, 'w+b')
+        else:
+            self.file = tempfile.TemporaryFile()
+        self.file.write(self.buffer.getvalue())
+        self.buffer = None
+
+    def commit(self) -> Tuple[ArtifactFile, int]:
+        # Returns the complete blob as a file positioned at the start, along with its size
+        self._storeCompressed(self.compressor.flush())
+        self._storeCompressed(_GZIP_TRAILER.pack(self.crc, self.contentSize & 0xffffffff))
+        for point in self.points:
+            self._store(_POINT.pack(*point))
+        header = _HEADER.pack(self.contentSize, self.compressedSize)
+
+        if self.file is None:
+            self.buffer.getbuffer()[:_HEADER.size] = header
+            blob = self.buffer.getvalue()
+            self.cache._putToMemory(self.id, blob)
+            return _opened(io.BytesIO(blob), self.size)
+
+        self.file.seek(0)
+        self.file.write(header)
+        self.file.flush()
+        if self.path is not None:
+            # The open file stays readable after being renamed or unlinked
+            try:
+                if self.size <= self.cache.diskLimit:
+                    path = self.cache._path(self.id)
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(self.path, path)
+                    self.path = None
+                    self.cache._accountDisk(self.size)
+                else:
+                    os.unlink(self.path)
+                    self.path = None
+            except OSError as e:
+                logger.warning("Failed to cache artifact %s on disk: %r", self.id, e)
+        self.file.seek(0)
+        return _opened(self.file, self.size)
+
+    def abort(self):
+        if self.file is not None:
+            self.file.close()
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+artifactCache = ArtifactCache(
+    directory=settings.EXEC_ARTIFACT_CACHE_DIR,
+    memoryLimit=settings.EXEC_ARTIFACT_CACHE_MEMORY_BYTES,
+    diskLimit=settings.EXEC_ARTIFACT_CACHE_DISK_BYTES,
+    smallThreshold=settings.EXEC_ARTIFACT_CACHE_SMALL_BYTES,
+    compressionLevel=settings.EXEC_ARTIFACT_COMPRESSION_LEVEL,
+)
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # Closed: calls go through and consecutive failures are counted. After `failureThreshold` of them the circuit
+    # opens and calls fail right away for `resetTimeout` seconds. Then it is half-open: one trial call goes through,
+    # its success closes the circuit and its failure opens it again.
+
+    def __init__(self, name: str, failureThreshold=5, resetTimeout=10.0):
+        self.name = name
+        self.failureThreshold = failureThreshold
+        self.resetTimeout = resetTimeout
+
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.openedAt = None
+        self.trialStartedAt = None
+
+    @property
+    def state(self) -> str:
+        with self.lock:
+            if self.openedAt is None:
+                return 'closed'
+            if time.monotonic() - self.openedAt < self.resetTimeout:
+                return 'open'
+            return 'half-open'
+
+    def check(self):
+        # Raises CircuitOpenError unless the call may go through
+        with self.lock:
+            if self.openedAt is None:
+                return
+            now = time.monotonic()
+            if now - self.openedAt < self.resetTimeout:
+                raise CircuitOpenError(f"{self.name} is unavailable, not calling it for a while")
+            # A trial that never reported back doesn't block the circuit forever
+            if self.trialStartedAt is not None and now - self.trialStartedAt < self.resetTimeout:
+                raise CircuitOpenError(f"{self.name} is unavailable, waiting for a trial call")
+            self.trialStartedAt = now
+
+    def recordSuccess(self):
+        with self.lock:
+            self.failures = 0
+            self.openedAt = None
+            self.trialStartedAt = None
+
+    def recordFailure(self):
+        with self.lock:
+            self.failures += 1
+            self.trialStartedAt = None
+            if self.openedAt is not None or self.failures >= self.failureThreshold:
+                self.openedAt = time.monotonic()
+
+
+def retryDelay(attempt: int, base: float, cap: float) -> float:
+    # Exponential backoff with full jitter, so that clients retrying together spread out
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -1,17 +1,30 @@
 from __future__ import annotations
 
+import asyncio
+import atexit
 import datetime
-import sys
+import functools
+import logging
+import time
+import weakref
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from enum import Enum
 import httpx
 from dataclasses import dataclass
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
 from django.conf import settings
 
+from .artifact_cache import ArtifactFile, artifactCache
+from .circuit_breaker import CircuitBreaker, CircuitOpenError, retryDelay
+from .metrics import execRequests, execRequestSeconds, execResponseBytes
+from .profiling import recordSpan, span
 
-@dataclass
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
 class ExitStatus:
     class Type(Enum):
         SIGNALED = "Signaled"
@@ -23,16 +36,25 @@ class ExitStatus:
     @staticmethod
     def FromExec(status: str) -> ExitStatus:
         tp, code = status.split()
-        if tp == "signaled":
-            tp = ExitStatus.Type.SIGNALED
-        elif tp == "exited":
-            tp = ExitStatus.Type.EXITED
-        else:
-            print(f"Unknown exit type: {tp}", file=sys.stderr)
+        try:
+            tp = _EXIT_TYPES[tp]
+        except KeyError:
+            raise ValueError(f"Unknown exit type: {tp}") from None
         return ExitStatus(code=int(code), type=tp)
 
 
-@dataclass
+_EXIT_TYPES = {
+    "signaled": ExitStatus.Type.SIGNALED,
+    "exited": ExitStatus.Type.EXITED,
+}
+
+
+def _microseconds(value: str) -> datetime.timedelta:
+    # Positional arguments are noticeably cheaper than microseconds=
+    return datetime.timedelta(0, 0, int(value))
+
+
+@dataclass(slots=True)
 class Statistics:
     wallTime: datetime.timedelta
     cpuTotalTime: datetime.timedelta
@@ -43,20 +65,41 @@ class Statistics:
     verdict: str
 
     @staticmethod
-    def FromExec(statistics: str):
-        stats = {k: v for k, v in map(lambda x: x.split(": "), statistics.strip().split('\n'))}
-        return Statistics(
-            wallTime=datetime.timedelta(microseconds=int(stats["time.wall"])),
-            cpuTotalTime=datetime.timedelta(microseconds=int(stats["time.cpu.total"])),
-            cpuUserTime=datetime.timedelta(microseconds=int(stats["time.cpu.user"])),
-            cpuSystemTime=datetime.timedelta(microseconds=int(stats["time.cpu.system"])),
-            maxMemory=int(stats["memory.max"]),
-            exitStatus=ExitStatus.FromExec(stats["status"]),
-            verdict=stats["verdict"],
-        )
-
-
-@dataclass
+    def FromExec(statistics: str) -> Statistics:
+        # One pass over the lines; keys we don't know are skipped, anything malformed is an error
+        values = [None] * len(_STATISTICS_FIELDS)
+        for line in statistics.splitlines():
+            if not line:
+                continue
+            key, sep, value = line.partition(": ")
+            if not sep:
+                raise ValueError(f"Malformed statistics line: {line!r}")
+            field = _STATISTICS_FIELDS.get(key)
+            if field is None:
+                continue
+            i, parse = field
+            if values[i] is not None:
+                raise ValueError(f"Duplicate statistics key: {key}")
+            values[i] = parse(value)
+        if None in values:
+            missing = [key for key, (i, _) in _STATISTICS_FIELDS.items() if values[i] is None]
+            raise ValueError(f"Missing statistics keys: {', '.join(missing)}")
+        return Statistics(*values)
+
+
+# Key in the exec statistics -> position of the Statistics field and its parser
+_STATISTICS_FIELDS: Dict[str, Tuple[int, Callable[[str], object]]] = {
+    "time.wall": (0, _microseconds),
+    "time.cpu.total": (1, _microseconds),
+    "time.cpu.user": (2, _microseconds),
+    "time.cpu.system": (3, _microseconds),
+    "memory.max": (4, int),
+    "status": (5, ExitStatus.FromExec),
+    "verdict": (6, str),
+}
+
+
+@dataclass(slots=True)
 class CompilationOutcome:
     binaryId: Optional[str]
     errorLogId: str
@@ -78,17 +121,20 @@ class ExecStatus(Enum):
 
     @staticmethod
     def FromExec(status: str) -> ExecStatus:
-        if status == "enqueued":
-            return ExecStatus.ENQUEUED
-        elif status == "processing":
-            return ExecStatus.PROCESSING
-        elif status == "finished":
-            return ExecStatus.FINISHED
-        else:
-            print(f"Unknown exec status: {status}", file=sys.stderr)
+        try:
+            return _EXEC_STATUSES[status]
+        except KeyError:
+            raise ValueError(f"Unknown exec status: {status}") from None
+
+
+_EXEC_STATUSES = {
+    "enqueued": ExecStatus.ENQUEUED,
+    "processing": ExecStatus.PROCESSING,
+    "finished": ExecStatus.FINISHED,
+}
 
 
-@dataclass
+@dataclass(slots=True)
 class CompilationStatus:
     execStatus: ExecStatus
     outcome: Optional[CompilationOutcome]
@@ -106,7 +152,7 @@ class CompilationStatus:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class RunOutcome:
     stdoutId: str
     stderrId: str
@@ -121,7 +167,7 @@ class RunOutcome:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class RunStatus:
     execStatus: ExecStatus
     outcome: Optional[RunOutcome]
@@ -138,7 +184,7 @@ class RunStatus:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class Submission:
     id: str
     srcId: str
@@ -151,63 +197,373 @@ class Submission:
         )
 
 
+ARTIFACT_CHUNK_SIZE = 64 << 10
+
+# Responses meaning that exec has no batch status endpoint
+BATCH_UNSUPPORTED_STATUS_CODES = (404, 405, 501)
+
+# Outputs and logs compress well, so they cross the network gzipped. The artifact cache stores them gzipped again
+# in a form it can seek in, see ArtifactWriter.
+ARTIFACT_REQUEST_HEADERS = {'Accept-Encoding': 'gzip'}
+
+
+def withCallback(params: Dict[str, str]) -> Dict[str, str]:
+    # Asks exec to notify us when the job finishes, see main/views_impl/webhooks.py
+    if settings.EXEC_WEBHOOK_URL:
+        params['callback'] = settings.EXEC_WEBHOOK_URL
+    return params
+
+
+def clientOptions():
+    return dict(
+        timeout=httpx.Timeout(settings.EXEC_API_TIMEOUT, connect=settings.EXEC_API_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=settings.EXEC_API_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.EXEC_API_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.EXEC_API_KEEPALIVE_EXPIRY,
+        ),
+        http2=settings.EXEC_API_HTTP2,
+    )
+
+
+def endpointTimeout(endpoint: str) -> httpx.Timeout:
+    return httpx.Timeout(
+        settings.EXEC_API_TIMEOUTS.get(endpoint, settings.EXEC_API_TIMEOUT),
+        connect=settings.EXEC_API_CONNECT_TIMEOUT,
+    )
+
+
+def isExecFailure(error: Exception) -> bool:
+    # Whether the error means exec is unhealthy, as opposed to it refusing this particular request
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        code = error.response.status_code
+        return code == 429 or code >= 500 and code != 501
+    return False
+
+
+# Everything a call to exec may fail with when exec is unavailable
+EXEC_ERRORS = (httpx.HTTPError, CircuitOpenError)
+
+
+def describeError(error: BaseException) -> str:
+    # For logs: httpx puts the request url, and so the api token, into its messages
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"{error.request.url.path} answered {error.response.status_code}"
+    if isinstance(error, httpx.RequestError):
+        return f"{type(error).__name__} on {error.request.url.path}"
+    return repr(error)
+
+
+def checkCircuit(endpoint: str):
+    try:
+        execCircuit.check()
+    except CircuitOpenError:
+        execRequests.inc(endpoint=endpoint, status='circuit_open')
+        raise
+
+
+def observeCall(endpoint: str, start: float, resp: Optional[httpx.Response] = None, error: Exception = None):
+    # Streamed bodies are counted as they are read, see openArtifact
+    seconds = time.perf_counter() - start
+    execRequests.inc(endpoint=endpoint, status=resp.status_code if resp is not None else type(error).__name__)
+    execRequestSeconds.observe(seconds, endpoint=endpoint)
+    recordSpan('exec', endpoint, seconds)
+    if resp is not None and resp.is_stream_consumed:
+        execResponseBytes.inc(len(resp.content), endpoint=endpoint)
+
+
+# Shared by all clients, they all talk to the same exec
+execCircuit = CircuitBreaker(
+    'exec',
+    failureThreshold=settings.EXEC_CIRCUIT_FAILURE_THRESHOLD,
+    resetTimeout=settings.EXEC_CIRCUIT_RESET_TIMEOUT,
+)
+
+
 class ExecApi:
     def __init__(self, url=settings.EXEC_API_URL, token=settings.EXEC_API_TOKEN):
         self.url = url
         self.token = token
+        # Connections are opened lazily and kept alive between calls
+        self.client = httpx.Client(**clientOptions())
+        self.batchStatusSupported = settings.EXEC_API_BATCH_STATUS
+
+    def close(self):
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _call(self, method: str, endpoint: str, retry=True, accept=(), stream=False, **kwargs) -> httpx.Response:
+        # Every request to exec goes through here: it fails fast while the circuit is open, and calls that are
+        # safe to repeat are retried with jitter. Submits and runs are not, the dispatcher retries those.
+        attempts = 1 + (settings.EXEC_API_RETRIES if retry else 0)
+        for attempt in range(attempts):
+            checkCircuit(endpoint)
+            start = time.perf_counter()
+            try:
+                request = self.client.build_request(
+                    method, f'{self.url}/{endpoint}', timeout=endpointTimeout(endpoint), **kwargs,
+                )
+                try:
+                    resp = self.client.send(request, stream=stream)
+                except httpx.HTTPError as e:
+                    observeCall(endpoint, start, error=e)
+                    raise
+                observeCall(endpoint, start, resp)
+                if resp.is_error and resp.status_code not in accept:
+                    resp.close()
+                    resp.raise_for_status()
+            except httpx.HTTPError as e:
+                if not isExecFailure(e):
+                    execCircuit.recordSuccess()
+                    raise
+                execCircuit.recordFailure()
+                if attempt + 1 == attempts:
+                    raise
+                logger.info("Exec %s failed, retrying: %s", endpoint, describeError(e))
+                time.sleep(retryDelay(attempt, settings.EXEC_API_RETRY_DELAY, settings.EXEC_API_RETRY_CAP))
+                continue
+            execCircuit.recordSuccess()
+            return resp
 
     def submit(self, file: bytes) -> Submission:
-        resp = httpx.post(
-            f'{self.url}/submit',
-            params={'token': self.token},
+        resp = self._call(
+            'POST', 'submit',
+            retry=False,
+            params=withCallback({'token': self.token}),
             files={'file': file},
         )
-        resp.raise_for_status()
-
         return Submission.FromExec(resp.json())
 
     def getSubmissionStatus(self, id: str) -> CompilationStatus:
-        resp = httpx.get(
-            f'{self.url}/compileStatus',
-            params={
-                'token': self.token,
-                'id': id,
-            },
-        )
-        resp.raise_for_status()
+        resp = self._call('GET', 'compileStatus', params={'token': self.token, 'id': id})
         return CompilationStatus.FromExec(resp.json())
 
     def getArtifact(self, id: str) -> bytes:
-        resp = httpx.get(
-            f'{self.url}/downloadArtifact',
-            params={
+        file, _ = self.openArtifact(id)
+        with file:
+            return file.read()
+
+    def openArtifact(self, id: str) -> Tuple[ArtifactFile, int]:
+        # Returns the artifact as a seekable file and its size; large artifacts are spooled to disk, not memory
+        with span('artifact', id):
+            opened = artifactCache.open(id)
+            if opened is not None:
+                return opened
+            resp = self._call(
+                'GET', 'downloadArtifact',
+                stream=True,
+                headers=ARTIFACT_REQUEST_HEADERS,
+                params={'token': self.token, 'id': id},
+            )
+            writer = artifactCache.writer(id)
+            try:
+                for chunk in resp.iter_bytes(ARTIFACT_CHUNK_SIZE):
+                    writer.write(chunk)
+            except BaseException:
+                writer.abort()
+                raise
+            finally:
+                resp.close()
+                execResponseBytes.inc(resp.num_bytes_downloaded, endpoint='downloadArtifact')
+            return writer.commit()
+
+    def run(self, id: str, input: Optional[bytes] = None) -> str:
+        resp = self._call(
+            'POST', 'run',
+            retry=False,
+            params=withCallback({
                 'token': self.token,
                 'id': id,
-            },
+            }),
+            files=None if input is None else {'input': input},
         )
-        return resp.text.encode()
-
-    def run(self, id: str) -> str:
-        resp = httpx.post(
-            f'{self.url}/run',
-            params={
-                'token': self.token,
-                'id': id,
-            }
-        )
-        resp.raise_for_status()
         return resp.json()["id"]
 
     def getRunStatus(self, id: str) -> RunStatus:
-        resp = httpx.get(
-            f"{self.url}/runStatus",
-            params={
+        resp = self._call('GET', 'runStatus', params={'token': self.token, 'id': id})
+        return RunStatus.FromExec(resp.json())
+
+    def getSubmissionStatuses(self, ids: List[str]) -> Dict[str, CompilationStatus]:
+        return self._getStatuses('compileStatuses', ids, CompilationStatus.FromExec, self.getSubmissionStatus)
+
+    def getRunStatuses(self, ids: List[str]) -> Dict[str, RunStatus]:
+        return self._getStatuses('runStatuses', ids, RunStatus.FromExec, self.getRunStatus)
+
+    def _getStatuses(self, endpoint: str, ids: List[str], parse: Callable, getOne: Callable) -> Dict:
+        # Ids whose status could not be fetched are missing from the result
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {}
+
+        if self.batchStatusSupported:
+            resp = self._call(
+                'POST', endpoint,
+                accept=BATCH_UNSUPPORTED_STATUS_CODES,
+                params={'token': self.token},
+                json={'ids': ids},
+            )
+            if resp.status_code not in BATCH_UNSUPPORTED_STATUS_CODES:
+                # One malformed status must not fail the others of the batch
+                statuses = {}
+                for id, status in resp.json().items():
+                    try:
+                        statuses[id] = parse(status)
+                    except Exception as e:
+                        logger.warning("Failed to parse status of %s: %r", id, e)
+                return statuses
+            logger.warning("Exec has no batch status endpoint, falling back to single requests")
+            self.batchStatusSupported = False
+
+        statuses = {}
+        with ThreadPoolExecutor(max_workers=min(len(ids), settings.EXEC_API_STATUS_CONCURRENCY)) as pool:
+            futures = {pool.submit(getOne, id): id for id in ids}
+            for future in as_completed(futures):
+                try:
+                    statuses[futures[future]] = future.result()
+                except Exception as e:
+                    logger.warning("Failed to fetch status of %s: %s", futures[future], describeError(e))
+        return statuses
+
+
+def _pooledUnderWsgi(method):
+    # Under WSGI every request runs on an event loop of its own, which an AsyncClient can't keep connections past;
+    # the sync client's pool outlives requests, so the call goes to it in a thread instead
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if not self.sharedLoop:
+            return await asyncio.to_thread(getattr(execApi, method.__name__), *args, **kwargs)
+        return await method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class AsyncExecApi:
+    def __init__(self, url=settings.EXEC_API_URL, token=settings.EXEC_API_TOKEN):
+        self.url = url
+        self.token = token
+        # Set by exec_demo/asgi.py: the ASGI server runs all requests on one long-lived event loop
+        self.sharedLoop = False
+        # An AsyncClient is bound to the event loop it was used on first, so keep one per loop
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = httpx.AsyncClient(**clientOptions())
+        return client
+
+    async def aclose(self):
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    async def _call(self, method: str, endpoint: str, retry=True, stream=False, **kwargs) -> httpx.Response:
+        # See ExecApi._call
+        client = self.client
+        attempts = 1 + (settings.EXEC_API_RETRIES if retry else 0)
+        for attempt in range(attempts):
+            checkCircuit(endpoint)
+            start = time.perf_counter()
+            try:
+                request = client.build_request(
+                    method, f'{self.url}/{endpoint}', timeout=endpointTimeout(endpoint), **kwargs,
+                )
+                try:
+                    resp = await client.send(request, stream=stream)
+                except httpx.HTTPError as e:
+                    observeCall(endpoint, start, error=e)
+                    raise
+                observeCall(endpoint, start, resp)
+                if resp.is_error:
+                    await resp.aclose()
+                    resp.raise_for_status()
+            except httpx.HTTPError as e:
+                if not isExecFailure(e):
+                    execCircuit.recordSuccess()
+                    raise
+                execCircuit.recordFailure()
+                if attempt + 1 == attempts:
+                    raise
+                logger.info("Exec %s failed, retrying: %s", endpoint, describeError(e))
+                await asyncio.sleep(retryDelay(attempt, settings.EXEC_API_RETRY_DELAY, settings.EXEC_API_RETRY_CAP))
+                continue
+            execCircuit.recordSuccess()
+            return resp
+
+    @_pooledUnderWsgi
+    async def submit(self, file: bytes) -> Submission:
+        resp = await self._call(
+            'POST', 'submit',
+            retry=False,
+            params=withCallback({'token': self.token}),
+            files={'file': file},
+        )
+        return Submission.FromExec(resp.json())
+
+    @_pooledUnderWsgi
+    async def getSubmissionStatus(self, id: str) -> CompilationStatus:
+        resp = await self._call('GET', 'compileStatus', params={'token': self.token, 'id': id})
+        return CompilationStatus.FromExec(resp.json())
+
+    @_pooledUnderWsgi
+    async def getArtifact(self, id: str) -> bytes:
+        file, _ = await self.openArtifact(id)
+        with file:
+            return await asyncio.to_thread(file.read)
+
+    @_pooledUnderWsgi
+    async def openArtifact(self, id: str) -> Tuple[ArtifactFile, int]:
+        with span('artifact', id):
+            opened = await asyncio.to_thread(artifactCache.open, id)
+            if opened is not None:
+                return opened
+            resp = await self._call(
+                'GET', 'downloadArtifact',
+                stream=True,
+                headers=ARTIFACT_REQUEST_HEADERS,
+                params={'token': self.token, 'id': id},
+            )
+            writer = artifactCache.writer(id)
+            try:
+                async for chunk in resp.aiter_bytes(ARTIFACT_CHUNK_SIZE):
+                    writer.write(chunk)
+            except BaseException:
+                writer.abort()
+                raise
+            finally:
+                await resp.aclose()
+                execResponseBytes.inc(resp.num_bytes_downloaded, endpoint='downloadArtifact')
+            return await asyncio.to_thread(writer.commit)
+
+    @_pooledUnderWsgi
+    async def run(self, id: str, input: Optional[bytes] = None) -> str:
+        resp = await self._call(
+            'POST', 'run',
+            retry=False,
+            params=withCallback({
                 'token': self.token,
                 'id': id,
-            }
+            }),
+            files=None if input is None else {'input': input},
         )
-        resp.raise_for_status()
+        return resp.json()["id"]
+
+    @_pooledUnderWsgi
+    async def getRunStatus(self, id: str) -> RunStatus:
+        resp = await self._call('GET', 'runStatus', params={'token': self.token, 'id': id})
         return RunStatus.FromExec(resp.json())
 
 
 execApi = ExecApi()
+atexit.register(execApi.close)
+
+asyncExecApi = AsyncExecApi()
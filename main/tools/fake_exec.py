@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import itertools
+import json
+import random
+import threading
+import time
+
+from collections import Counter
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeExec:
+    # A stand-in for the exec service, speaking the same http api, for benchmarks and local development.
+    # Compilations and runs finish after a fixed number of status polls and always succeed.
+
+    def __init__(self, latency=0.0, failureRate=0.0, artifactBytes=4096, pollsUntilFinished=2, batchStatus=True,
+                 compression=True, seed=None):
+        self.latency = latency
+        self.failureRate = failureRate
+        self.artifactBytes = artifactBytes
+        self.pollsUntilFinished = pollsUntilFinished
+        self.batchStatus = batchStatus
+        # Whether artifacts are gzipped for clients that accept it
+        self.compression = compression
+
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.ids = itertools.count(1)
+        self.polls = Counter()
+        self.sources: Dict[str, bytes] = {}
+        self.requests = Counter()
+        self.failures = Counter()
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self, host='127.0.0.1', port=0) -> FakeExec:
+        fake = self
+
+        class Handler(_Handler):
+            exec = fake
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _shouldFail(self, endpoint: str) -> bool:
+        with self.lock:
+            self.requests[endpoint] += 1
+            fail = self.failureRate and self.random.random() < self.failureRate
+            if fail:
+                self.failures[endpoint] += 1
+        return fail
+
+    def _nextId(self, prefix: str) -> str:
+        with self.lock:
+            return f'{prefix}{next(self.ids)}'
+
+    def submit(self, source: bytes) -> dict:
+        id = self._nextId('c')
+        srcId = f'src-{id}'
+        with self.lock:
+            self.sources[srcId] = source
+        return {'id': id, 'src-id': srcId}
+
+    def run(self) -> dict:
+        return {'id': self._nextId('r')}
+
+    def status(self, kind: str, id: str) -> dict:
+        with self.lock:
+            self.polls[id] += 1
+            polls = self.polls[id]
+        if polls < self.pollsUntilFinished:
+            return {'status': 'enqueued' if polls == 1 else 'processing'}
+        stats = _stats(id)
+        if kind == 'compile':
+            return {'status': 'finished', 'binary-id': f'bin-{id}', 'error-log-id': f'log-{id}', 'stats': stats}
+        return {'status': 'finished', 'stdout-id': f'out-{id}', 'stderr-id': f'err-{id}', 'stats': stats}
+
+    def artifact(self, id: str) -> bytes:
+        with self.lock:
+            source = self.sources.get(id)
+        if source is not None:
+            return source
+        # Deterministic filler, so that repeated downloads of an id match
+        line = hashlib.sha256(id.encode()).hexdigest().encode() + b'\n'
+        return (line * (self.artifactBytes // len(line) + 1))[:self.artifactBytes]
+
+
+def _stats(id: str) -> str:
+    rnd = random.Random(id)
+    return (
+        f"time.wall: {rnd.randrange(10 ** 6)}\n"
+        f"time.cpu.total: {rnd.randrange(10 ** 6)}\n"
+        f"time.cpu.user: {rnd.randrange(10 ** 6)}\n"
+        f"time.cpu.system: {rnd.randrange(10 ** 5)}\n"
+        f"memory.max: {rnd.randrange(1 << 28)}\n"
+        "status: exited 0\n"
+        "verdict: OK\n"
+    )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    exec: FakeExec = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code: int, body, contentType='application/json', encoding=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', contentType)
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _begin(self):
+        url = urlparse(self.path)
+        endpoint = url.path.lstrip('/')
+        if self.exec.latency:
+            time.sleep(self.exec.latency)
+        if self.exec._shouldFail(endpoint):
+            self._send(503, {'error': 'injected failure'})
+            return None, None
+        return endpoint, {k: v[0] for k, v in parse_qs(url.query).items()}
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _file(self, name: str) -> Optional[bytes]:
+        # The multipart form the api client uploads files with
+        header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode()
+        message = BytesParser(policy=HTTP).parsebytes(header + self._body())
+        for part in message.iter_parts():
+            if part.get_param('name', header='content-disposition') == name:
+                return part.get_payload(decode=True)
+        return None
+
+    def do_GET(self):
+        endpoint, params = self._begin()
+        if endpoint is None:
+            return
+        if endpoint == 'compileStatus':
+            return self._send(200, self.exec.status('compile', params['id']))
+        if endpoint == 'runStatus':
+            return self._send(200, self.exec.status('run', params['id']))
+        if endpoint == 'downloadArtifact':
+            artifact = self.exec.artifact(params['id'])
+            if self.exec.compression and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                return self._send(200, gzip.compress(artifact, mtime=0), 'application/octet-stream', 'gzip')
+            return self._send(200, artifact, 'application/octet-stream')
+        self._send(404, {'error': 'not found'})
+
+    def do_POST(self):
+        endpoint, params = self._begin()
+        if endpoint is None:
+            # The body has to be drained for the connection to be reused
+            self._body()
+            return
+        if endpoint == 'submit':
+            return self._send(200, self.exec.submit(self._file('file') or b''))
+        if endpoint == 'run':
+            self._body()
+            return self._send(200, self.exec.run())
+        if endpoint in ('compileStatuses', 'runStatuses') and self.exec.batchStatus:
+            kind = 'compile' if endpoint == 'compileStatuses' else 'run'
+            ids = json.loads(self._body())['ids']
+            return self._send(200, {id: self.exec.status(kind, id) for id in ids})
+        self._body()
+        self._send(404, {'error': 'not found'})
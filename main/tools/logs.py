@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import datetime
+import json
+import logging
+import threading
+import time
+
+from typing import Dict, Tuple
+
+# Attributes every LogRecord has; anything else was passed through `extra=` and goes into the json as is
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class RateLimitFilter(logging.Filter):
+    # Lets through at most `burst` records per `interval` seconds for every logger and message template, so that
+    # an unavailable exec doesn't turn into a line per polled row. The first record after a quiet period tells how
+    # many were dropped.
+
+    def __init__(self, burst=10, interval=60.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.windows: Dict[Tuple[str, str], list] = {}  # (logger, template) -> [window start, passed, suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window is not None else 0
+                window = self.windows[key] = [now, 0, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+            if window[1] >= self.burst:
+                window[2] += 1
+                return False
+            window[1] += 1
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    # One json object per line, for log collectors
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            text += f" ({suppressed} similar messages suppressed)"
+        return text
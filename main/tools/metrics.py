@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Prometheus' defaults, for request latencies
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+# For things measured in seconds to minutes, like polling lag or time to verdict
+SLOW_BUCKETS = (.1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name: str, help: str, labelNames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelNames = tuple(labelNames)
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.labelNames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def __init__(self, name, help, labelNames=()):
+        super().__init__(name, help, labelNames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = list(self.values.items())
+        return [f'{self.name}{_labels(self.labelNames, k)} {_number(v)}' for k, v in values]
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelNames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelNames)
+        self.buckets = tuple(sorted(buckets))
+        self.values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[i] += 1
+            total[0] += value
+
+    def samples(self):
+        with self.lock:
+            values = [(k, list(counts), total[0]) for k, (counts, total) in self.values.items()]
+        lines = []
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f'{self.name}_bucket{_labels(self.labelNames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelNames, key)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelNames, key)} {cumulative}')
+        return lines
+
+
+class Collected(_Metric):
+    # Computed at scrape time, e.g. from the database: `collect` returns {label values: value}
+
+    def __init__(self, name, help, labelNames=(), collect: Callable[[], Dict[Tuple[str, ...], float]] = None,
+                 type='gauge'):
+        super().__init__(name, help, labelNames)
+        self.type = type
+        self.collect = collect
+
+    def samples(self):
+        return [f'{self.name}{_labels(self.labelNames, k)} {_number(v)}' for k, v in self.collect().items()]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelNames=()) -> Counter:
+        return self.register(Counter(name, help, labelNames))
+
+    def histogram(self, name, help, labelNames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelNames, buckets))
+
+    def collected(self, name, help, labelNames=(), collect=None, type='gauge') -> Collected:
+        return self.register(Collected(name, help, labelNames, collect, type))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self.metrics.get(name)
+
+    def expose(self) -> str:
+        # Prometheus text format 0.0.4
+        return '\n'.join(metric.expose() for metric in self.metrics.values()) + '\n'
+
+
+# Per process: with several workers every one of them has to be scraped, or their numbers summed up
+registry = Registry()
+
+execRequests = registry.counter(
+    'exec_api_requests_total', "Requests to exec by endpoint and response status", ('endpoint', 'status'),
+)
+execRequestSeconds = registry.histogram(
+    'exec_api_request_seconds', "Time until exec's response headers, by endpoint", ('endpoint',),
+)
+execResponseBytes = registry.counter(
+    'exec_api_response_bytes_total', "Bytes received from exec by endpoint", ('endpoint',),
+)
+pollLag = registry.histogram(
+    'exec_poll_lag_seconds', "How late rows are polled compared to their nextCheck", ('model',), SLOW_BUCKETS,
+)
+timeToVerdict = registry.histogram(
+    'exec_time_to_verdict_seconds', "Time from creating a row until exec reports it finished", ('model',),
+    SLOW_BUCKETS,
+)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import cProfile
+import threading
+import time
+
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from django.template.backends.django import DjangoTemplates
+
+# The profile of the request being served, if it is profiled. asgiref copies the context into the threads and event
+# loops it hands work to, so spans recorded there land in the same profile.
+_current: contextvars.ContextVar[Optional[Profile]] = contextvars.ContextVar('profile', default=None)
+
+# cProfile hooks the thread it is enabled on and only one can be active per thread; requests profiled while it is
+# busy still get their spans
+_profilerLock = threading.Lock()
+
+
+class Profile:
+    def __init__(self, cprofile=False):
+        self.spans: List[Tuple[str, str, float]] = []  # (category, name, seconds)
+        self.profiler = cProfile.Profile() if cprofile and _profilerLock.acquire(blocking=False) else None
+        self.start = self.duration = None
+        self._token = None
+
+    def __enter__(self) -> Profile:
+        self._token = _current.set(self)
+        self.start = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *args):
+        if self.profiler is not None:
+            self.profiler.disable()
+            _profilerLock.release()
+        self.duration = time.perf_counter() - self.start
+        _current.reset(self._token)
+
+    def add(self, category: str, name: str, seconds: float):
+        self.spans.append((category, name, seconds))
+
+    def totals(self) -> Dict[str, Tuple[int, float]]:
+        # category -> (count, seconds); spans of one category may overlap, e.g. artifacts fetched concurrently
+        totals = defaultdict(lambda: (0, 0.0))
+        for category, _, seconds in self.spans:
+            count, total = totals[category]
+            totals[category] = (count + 1, total + seconds)
+        return dict(totals)
+
+    def serverTiming(self) -> str:
+        entries = [
+            f'{category};dur={seconds * 1000:.1f};desc="{count}"'
+            for category, (count, seconds) in self.totals().items()
+        ]
+        entries.append(f'total;dur={self.duration * 1000:.1f}')
+        return ', '.join(entries)
+
+    def dump(self, path: Path):
+        # pstats format: snakeviz, flameprof or `python -m pstats` read it
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.profiler.dump_stats(path)
+
+
+def currentProfile() -> Optional[Profile]:
+    return _current.get()
+
+
+def recordSpan(category: str, name: str, seconds: float):
+    profile = _current.get()
+    if profile is not None:
+        profile.add(category, name, seconds)
+
+
+@contextlib.contextmanager
+def span(category: str, name: str):
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(category, name, time.perf_counter() - start)
+
+
+def sqlSpan(execute, sql, params, many, context):
+    # Installed on every database connection, see MainConfig.ready
+    if _current.get() is None:
+        return execute(sql, params, many, context)
+    with span('db', sql.split(None, 1)[0] if sql else ''):
+        return execute(sql, params, many, context)
+
+
+class ProfiledTemplates(DjangoTemplates):
+    # The Django template backend, recording a span for every render
+
+    def from_string(self, template_code):
+        return _ProfiledTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _ProfiledTemplate(super().get_template(template_name))
+
+
+class _ProfiledTemplate:
+    def __init__(self, template):
+        self.template = template
+        self.origin = template.origin
+
+    def render(self, context=None, request=None):
+        with span('template', self.origin.template_name or ''):
+            return self.template.render(context, request)
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import weakref
+
+from typing import Any, Awaitable, Callable, Dict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class StatusCache:
+    # Exec statuses by exec id, kept for a short while in the Django cache, so that everyone looking at
+    # the same pending row shares one request to exec. Concurrent misses are coalesced ("single flight"):
+    # within a process by a lock or a shared task, across processes by a lock entry in the cache itself.
+
+    LOCK_STRIPES = 64
+
+    def __init__(self, alias='default', ttl=1.0, lockTimeout=5.0, waitInterval=0.05):
+        self.alias = alias
+        self.ttl = ttl
+        self.lockTimeout = lockTimeout
+        self.waitInterval = waitInterval
+
+        self.locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        # Tasks are bound to their event loop, so every loop coalesces its own
+        self.inFlight = weakref.WeakKeyDictionary()
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def _key(kind: str, execId: str) -> str:
+        return f'exec-status:{kind}:{execId}'
+
+    def put(self, kind: str, execId: str, status):
+        if self.ttl:
+            self.cache.set(self._key(kind, execId), status, self.ttl)
+
+    def putMany(self, kind: str, statuses: Dict[str, Any]):
+        if self.ttl and statuses:
+            self.cache.set_many({self._key(kind, id): status for id, status in statuses.items()}, self.ttl)
+
+    def get(self, kind: str, execId: str, fetch: Callable[[str], Any]):
+        if not self.ttl:
+            return fetch(execId)
+        key = self._key(kind, execId)
+        status = self.cache.get(key)
+        if status is not None:
+            self.hits += 1
+            return status
+        with self.locks[hash(key) % self.LOCK_STRIPES]:
+            status = self.cache.get(key)
+            if status is not None:
+                self.hits += 1
+                return status
+            return self._fetch(key, execId, fetch)
+
+    def _fetch(self, key: str, execId: str, fetch: Callable[[str], Any]):
+        lockKey = f'{key}:lock'
+        if not self.cache.add(lockKey, True, self.lockTimeout):
+            # Another process is asking exec already, wait for its answer rather than asking too
+            deadline = time.monotonic() + self.lockTimeout
+            while time.monotonic() < deadline:
+                time.sleep(self.waitInterval)
+                status = self.cache.get(key)
+                if status is not None:
+                    self.hits += 1
+                    return status
+            lockKey = None
+        self.misses += 1
+        try:
+            status = fetch(execId)
+            self.cache.set(key, status, self.ttl)
+            return status
+        finally:
+            if lockKey is not None:
+                self.cache.delete(lockKey)
+
+    async def aget(self, kind: str, execId: str, fetch: Callable[[str], Awaitable[Any]]):
+        if not self.ttl:
+            return await fetch(execId)
+        key = self._key(kind, execId)
+        status = await self.cache.aget(key)
+        if status is not None:
+            self.hits += 1
+            return status
+        inFlight = self.inFlight.setdefault(asyncio.get_running_loop(), {})
+        task = inFlight.get(key)
+        if task is None:
+            task = inFlight[key] = asyncio.ensure_future(self._afetch(key, execId, fetch))
+            task.add_done_callback(lambda _: inFlight.pop(key, None))
+        else:
+            self.hits += 1
+        # A viewer going away must not cancel the request the others are waiting for
+        return await asyncio.shield(task)
+
+    async def _afetch(self, key: str, execId: str, fetch: Callable[[str], Awaitable[Any]]):
+        lockKey = f'{key}:lock'
+        if not await self.cache.aadd(lockKey, True, self.lockTimeout):
+            deadline = time.monotonic() + self.lockTimeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.waitInterval)
+                status = await self.cache.aget(key)
+                if status is not None:
+                    self.hits += 1
+                    return status
+            lockKey = None
+        self.misses += 1
+        try:
+            status = await fetch(execId)
+            await self.cache.aset(key, status, self.ttl)
+            return status
+        finally:
+            if lockKey is not None:
+                await self.cache.adelete(lockKey)
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+statusCache = StatusCache(
+    alias=settings.EXEC_STATUS_CACHE_ALIAS,
+    ttl=settings.EXEC_STATUS_CACHE_TTL,
+    lockTimeout=settings.EXEC_STATUS_CACHE_LOCK_TIMEOUT,
+)
@@ -2,6 +2,7 @@ from django.urls import path
 
 from .views import (
     SubmissionsView,
+    ImportSubmissionsView,
     SubmissionView,
     LoginView,
     Index,
@@ -10,6 +11,13 @@ from .views import (
     RunView,
     RunsView,
     CreateRunView,
+    RunBatchView,
+    CreateRunBatchView,
+    RunArtifactView,
+    SubmissionArtifactView,
+    ExecCallbackView,
+    EventsView,
+    MetricsView,
 )
 
 url_patterns = [
@@ -18,8 +26,16 @@ url_patterns = [
     path('signup', SignupView.as_view(), name='signup'),
     path('logout', LogoutView.as_view(), name='logout'),
     path('submissions', SubmissionsView.as_view(), name='submissions'),
+    path('importSubmissions', ImportSubmissionsView.as_view(), name='import-submissions'),
     path('submission/<int:id>', SubmissionView.as_view(), name='submission'),
+    path('submission/<int:id>/<str:kind>', SubmissionArtifactView.as_view(), name='submission-artifact'),
     path('run/<int:id>', RunView.as_view(), name='run'),
+    path('run/<int:id>/<str:kind>', RunArtifactView.as_view(), name='run-artifact'),
     path('runs', RunsView.as_view(), name='runs'),
-    path('createRun/<int:id>', CreateRunView.as_view(), name='create-run')
+    path('createRun/<int:id>', CreateRunView.as_view(), name='create-run'),
+    path('runBatch/<int:id>', RunBatchView.as_view(), name='run-batch'),
+    path('createRunBatch/<int:id>', CreateRunBatchView.as_view(), name='create-run-batch'),
+    path('exec/callback', ExecCallbackView.as_view(), name='exec-callback'),
+    path('events', EventsView.as_view(), name='events'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
@@ -4,12 +4,20 @@ from django.views import View
 from .views_impl import (
     SubmissionView,
     SubmissionsView,
+    ImportSubmissionsView,
     RunView,
     RunsView,
     CreateRunView,
+    RunBatchView,
+    CreateRunBatchView,
     LoginView,
     LogoutView,
     SignupView,
+    RunArtifactView,
+    SubmissionArtifactView,
+    ExecCallbackView,
+    EventsView,
+    MetricsView,
 )
 
 
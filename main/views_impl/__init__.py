@@ -1,3 +1,7 @@
-from .runs import RunView, RunsView, CreateRunView
-from .submissions import SubmissionsView, SubmissionView
+from .runs import RunView, RunsView, CreateRunView, RunBatchView, CreateRunBatchView
+from .submissions import SubmissionsView, SubmissionView, ImportSubmissionsView
 from .auth import LoginView, LogoutView, SignupView
+from .artifacts import RunArtifactView, SubmissionArtifactView
+from .webhooks import ExecCallbackView
+from .events import EventsView
+from .metrics import MetricsView
@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import logging
+import re
+
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.views import View
+
+from main.models_impl import ExecStatus, Run, Submission
+from main.tools.exec_api import asyncExecApi, describeError, ARTIFACT_CHUNK_SIZE, EXEC_ERRORS
+from .common import alogin_required, aget_object_or_404, streamedChunks
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ArtifactPreview:
+    head: str
+    tail: Optional[str]
+    size: int
+
+    @property
+    def omitted(self) -> int:
+        if self.tail is None:
+            return 0
+        return self.size - 2 * settings.EXEC_ARTIFACT_PREVIEW_BYTES
+
+
+def _readPreview(file: BinaryIO, size: int) -> ArtifactPreview:
+    limit = settings.EXEC_ARTIFACT_PREVIEW_BYTES
+    with file:
+        if size <= 2 * limit:
+            return ArtifactPreview(head=file.read().decode(errors='replace'), tail=None, size=size)
+        head = file.read(limit)
+        file.seek(size - limit)
+        tail = file.read(limit)
+    return ArtifactPreview(head=head.decode(errors='replace'), tail=tail.decode(errors='replace'), size=size)
+
+
+async def artifactPreview(id: str) -> ArtifactPreview:
+    # Only the head and the tail of the artifact are kept in memory, however large it is
+    file, size = await asyncExecApi.openArtifact(id)
+    return await asyncio.to_thread(_readPreview, file, size)
+
+
+def _parseRange(header: Optional[str], size: int):
+    # Returns (first, last) of a single satisfiable range, None to serve the whole artifact, or False if unsatisfiable
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None  # Multiple ranges or garbage; ignoring Range is always allowed
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        first, last = max(size - int(last), 0), size - 1
+    elif last and int(last) < int(first):
+        return None  # Invalid rather than unsatisfiable, so it is ignored
+    else:
+        first, last = int(first), min(int(last), size - 1) if last else size - 1
+    if first >= size or first > last:
+        return False
+    return first, last
+
+
+def _acceptsGzip(header: Optional[str]) -> bool:
+    # gzip is acceptable if listed, or covered by '*', with a non-zero quality
+    qualities = {}
+    for item in (header or '').split(','):
+        coding, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    return qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0))) > 0
+
+
+def _readRange(file: BinaryIO, first: int, length: int):
+    try:
+        file.seek(first)
+        while length > 0:
+            chunk = file.read(min(ARTIFACT_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+async def artifactResponse(req, id: str, filename: str):
+    # Artifacts are kept gzipped, so browsers that accept it get those bytes as they are. Ranges are served
+    # from the content, which is what they refer to.
+    compressed = not req.headers.get('Range') and _acceptsGzip(req.headers.get('Accept-Encoding'))
+    # Artifacts never change, so the id is a strong validator; each encoding has its own
+    etag = f'"{hashlib.sha256(id.encode()).hexdigest()[:32]}{"-gzip" if compressed else ""}"'
+    if req.headers.get('If-None-Match') == etag:
+        return HttpResponseNotModified(headers={'ETag': etag, 'Vary': 'Accept-Encoding'})
+
+    try:
+        file, size = await asyncExecApi.openArtifact(id)
+    except EXEC_ERRORS as e:
+        logger.warning("Failed to fetch artifact %s: %s", id, describeError(e))
+        return HttpResponse("Exec is not responding, please try again later", status=503, headers={'Retry-After': '10'})
+
+    if compressed:
+        resp = StreamingHttpResponse(
+            streamedChunks(req, _readRange(file.detachCompressed(), 0, file.compressedSize)),
+            content_type='text/plain; charset=utf-8',
+        )
+        resp['Content-Encoding'] = 'gzip'
+        resp['Content-Length'] = str(file.compressedSize)
+        return _withHeaders(resp, etag, filename)
+
+    byteRange = None
+    if req.headers.get('If-Range', etag) == etag:
+        byteRange = _parseRange(req.headers.get('Range'), size)
+    if byteRange is False:
+        file.close()
+        return HttpResponse(status=416, headers={'Content-Range': f'bytes */{size}'})
+
+    first, last = byteRange or (0, size - 1)
+    resp = StreamingHttpResponse(
+        streamedChunks(req, _readRange(file, first, last - first + 1)),
+        status=206 if byteRange else 200,
+        content_type='text/plain; charset=utf-8',
+    )
+    resp['Content-Length'] = str(last - first + 1)
+    if byteRange:
+        resp['Content-Range'] = f'bytes {first}-{last}/{size}'
+    return _withHeaders(resp, etag, filename)
+
+
+def _withHeaders(resp, etag: str, filename: str):
+    resp['Accept-Ranges'] = 'bytes'
+    resp['ETag'] = etag
+    resp['Vary'] = 'Accept-Encoding'
+    resp['Cache-Control'] = 'private, max-age=31536000, immutable'
+    resp['Content-Disposition'] = f'inline; filename="{filename}"'
+    return resp
+
+
+class RunArtifactView(View):
+    @alogin_required(login_url="login")
+    async def get(self, req, id: int, kind: str):
+        run = await aget_object_or_404(Run.objects.select_related('submission', 'runResult'), pk=id)
+        if run.submission.user_id != req.user.pk and not req.user.is_staff:
+            raise PermissionDenied("Not your run")
+        if run.execStatus != ExecStatus.FINISHED or run.runResult is None:
+            raise Http404("The run has not finished yet")
+        if kind == 'stdout':
+            artifactId = run.runResult.stdoutId
+        elif kind == 'stderr':
+            artifactId = run.runResult.stderrId
+        else:
+            raise Http404(f"Runs have no {kind}")
+        return await artifactResponse(req, artifactId, f'run-{run.pk}-{kind}.txt')
+
+
+class SubmissionArtifactView(View):
+    @alogin_required(login_url="login")
+    async def get(self, req, id: int, kind: str):
+        subm = await aget_object_or_404(Submission.objects.select_related('compilationResult'), pk=id)
+        if not req.user.is_staff and subm.user_id != req.user.pk:
+            raise PermissionDenied("Not your submission")
+        if kind == 'source' and subm.sourceId:
+            artifactId = subm.sourceId
+        elif kind == 'logs' and subm.compilationResult is not None:
+            artifactId = subm.compilationResult.errorLog
+        else:
+            raise Http404(f"The submission has no {kind}")
+        return await artifactResponse(req, artifactId, f'submission-{subm.pk}-{kind}.txt')
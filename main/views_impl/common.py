@@ -0,0 +1,82 @@
+import asyncio
+import functools
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import REDIRECT_FIELD_NAME
+from django.contrib.auth.views import redirect_to_login
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404
+from django.shortcuts import resolve_url
+
+from main.tools.exec_api import EXEC_ERRORS, describeError
+from main.tools.profiling import span
+
+logger = logging.getLogger(__name__)
+
+
+def alogin_required(login_url):
+    # login_required counterpart for `async def` view methods: request.user is lazy and may hit the database
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, req, *args, **kwargs):
+            if not await sync_to_async(lambda: req.user.is_authenticated)():
+                return redirect_to_login(req.get_full_path(), resolve_url(login_url), REDIRECT_FIELD_NAME)
+            return await method(self, req, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def servedByAsgi(req) -> bool:
+    # Under WSGI, a streaming response is only sent once it has ended, and holds a worker meanwhile
+    return isinstance(req, ASGIRequest)
+
+
+def streamedChunks(req, chunks):
+    # Streaming responses buffer their whole content when iterated in the other mode than the server's,
+    # so the chunks are given to the server the way it iterates them
+    if not servedByAsgi(req):
+        return chunks
+
+    async def achunks():
+        try:
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            chunks.close()
+
+    return achunks()
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+
+
+async def arefresh(row) -> bool:
+    # Brings the row up to date if exec answers in time; otherwise pages show the last known state, marked stale
+    try:
+        with span('refresh', row._meta.model_name):
+            await asyncio.wait_for(row.atryUpdate(), settings.EXEC_VIEW_STATUS_TIMEOUT)
+    except (asyncio.TimeoutError, ValueError, *EXEC_ERRORS) as e:
+        # ValueError: exec answered with a status we can't read
+        logger.warning("Showing the last known state of %s: %s", row, describeError(e))
+        return False
+    return True
+
+
+async def orUnavailable(awaitable):
+    # For the parts of a page that come from exec: None if exec can't provide them now
+    try:
+        return await awaitable
+    except EXEC_ERRORS as e:
+        logger.warning("Exec is unavailable: %s", describeError(e))
+        return None
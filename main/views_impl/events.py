@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+from typing import List
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views import View
+
+from main.models_impl import Run, Submission, LISTED_FIELDS
+from .common import alogin_required, servedByAsgi
+
+MAX_WATCHED = 100
+
+# Streams open in this process; the ASGI server runs them all on one event loop
+_openStreams = 0
+
+
+def _parseIds(values):
+    ids = set()
+    for value in values[:MAX_WATCHED]:
+        try:
+            ids.add(int(value))
+        except ValueError:
+            pass
+    return ids
+
+
+def _event(kind: str, data) -> str:
+    return f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+
+
+def _rows(user):
+    submissions = Submission.objects.only(*LISTED_FIELDS)
+    runs = Run.objects.only(*LISTED_FIELDS)
+    if not user.is_staff:
+        submissions = submissions.filter(user=user)
+        runs = runs.filter(submission__user=user)
+    return (('submission', submissions), ('run', runs))
+
+
+async def _changedEvents(rows, watched, sent) -> List[str]:
+    # Events for the watched rows whose status differs from the one sent; finished rows are dropped from watched.
+    # Only the watched pending rows are queried, so this costs at most two small indexed queries.
+    events = []
+    for kind, queryset in rows:
+        if not watched[kind]:
+            continue
+        pending = set()
+        async for row in queryset.filter(pk__in=watched[kind]):
+            if kind == 'submission':
+                status = row.overallCompilationStatus()
+            else:
+                status = row.overallStatus
+            finished = not row.isPending()
+            if sent.get((kind, row.pk)) != status:
+                sent[(kind, row.pk)] = status
+                events.append(_event(kind, {'id': row.pk, 'status': status, 'finished': finished}))
+            if not finished:
+                pending.add(row.pk)
+        watched[kind] = pending
+    return events
+
+
+async def _statusEvents(user, watched):
+    # Sends the current status of every watched row, then every change, and forgets rows once they finish
+    global _openStreams
+    _openStreams += 1
+    try:
+        rows = _rows(user)
+        sent = {}
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.EXEC_EVENTS_MAX_DURATION
+        lastWrite = loop.time()
+
+        while any(watched.values()):
+            events = await _changedEvents(rows, watched, sent)
+            now = loop.time()
+            if events:
+                yield ''.join(events)
+                lastWrite = now
+            elif now - lastWrite >= settings.EXEC_EVENTS_HEARTBEAT:
+                yield ": ping\n\n"
+                lastWrite = now
+            if now >= deadline:
+                # The browser reconnects by itself, which bounds the lifetime of a single response
+                return
+            await asyncio.sleep(settings.EXEC_EVENTS_INTERVAL)
+
+        yield _event('done', {})
+    finally:
+        _openStreams -= 1
+
+
+async def _statusSnapshot(user, watched) -> str:
+    # The current status of every watched row in a response that ends at once; the browser reconnects after
+    # the retry delay, which makes it a poll
+    events = await _changedEvents(_rows(user), watched, {})
+    if any(watched.values()):
+        events.append(f"retry: {int(settings.EXEC_EVENTS_POLL_INTERVAL * 1000)}\n\n")
+    else:
+        events.append(_event('done', {}))
+    return ''.join(events)
+
+
+class EventsView(View):
+    # Server-sent events with the status of the pending submissions and runs shown on a page; the rows to watch
+    # are given as ?submission=<id>&run=<id>... Only the ASGI server can hold a stream open without tying up a
+    # worker, so elsewhere, and past EXEC_EVENTS_MAX_STREAMS streams, each request gets the current statuses
+    # and the browser polls.
+
+    @alogin_required(login_url='login')
+    async def get(self, req):
+        watched = {
+            'submission': _parseIds(req.GET.getlist('submission')),
+            'run': _parseIds(req.GET.getlist('run')),
+        }
+        if servedByAsgi(req) and _openStreams < settings.EXEC_EVENTS_MAX_STREAMS:
+            resp = StreamingHttpResponse(_statusEvents(req.user, watched), content_type='text/event-stream')
+            resp['X-Accel-Buffering'] = 'no'
+        else:
+            resp = HttpResponse(await _statusSnapshot(req.user, watched), content_type='text/event-stream')
+        resp['Cache-Control'] = 'no-cache'
+        return resp
@@ -0,0 +1,74 @@
+import hmac
+
+from django.conf import settings
+from django.db.models import Count
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views import View
+
+from main.models_impl import ExecJob, Run, Submission
+from main.tools.artifact_cache import artifactCache
+from main.tools.exec_api import execCircuit
+from main.tools.metrics import registry
+from main.tools.status_cache import statusCache
+
+CIRCUIT_STATES = ('closed', 'half-open', 'open')
+
+
+def _pendingRows():
+    # Rows still polled, by where exec has them; the poller's partial index covers this
+    counts = {}
+    for model in (Submission, Run):
+        rows = model.objects.filter(nextCheck__isnull=False).values_list('execStatus').annotate(count=Count('pk'))
+        for execStatus, count in rows:
+            counts[model._meta.model_name, execStatus] = count
+    return counts
+
+
+def _unfinishedJobs():
+    # Delivered jobs are deleted, so every job left is either unfinished or failed
+    rows = ExecJob.objects.values_list('kind', 'state').annotate(count=Count('pk'))
+    return {(kind, state): count for kind, state, count in rows}
+
+
+registry.collected(
+    'exec_pending_rows', "Submissions and runs waiting for exec, by exec status", ('model', 'exec_status'),
+    _pendingRows,
+)
+registry.collected(
+    'exec_jobs', "Requests to exec not sent yet, and the ones that failed for good, by kind and state",
+    ('kind', 'state'), _unfinishedJobs,
+)
+registry.collected(
+    'exec_circuit_state', "1 for the current state of the circuit breaker around exec", ('state',),
+    lambda: {(state,): int(state == execCircuit.state) for state in CIRCUIT_STATES},
+)
+registry.collected(
+    'exec_status_cache_requests_total', "Status lookups answered by the shared cache or by exec", ('result',),
+    lambda: {(result,): count for result, count in statusCache.stats().items()}, 'counter',
+)
+registry.collected(
+    'exec_artifact_cache_requests_total', "Artifact reads by the tier that answered them", ('result',),
+    lambda: {(result,): artifactCache.stats()[result] for result in ('memoryHits', 'diskHits', 'misses')},
+    'counter',
+)
+registry.collected(
+    'exec_artifact_cache_memory_bytes', "Size of the artifacts cached in memory", (),
+    lambda: {(): artifactCache.stats()['memoryBytes']},
+)
+
+
+def _isAllowed(req) -> bool:
+    if settings.METRICS_TOKEN:
+        scheme, _, token = req.headers.get('Authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(token, settings.METRICS_TOKEN)
+    return req.user.is_staff
+
+
+class MetricsView(View):
+    # Prometheus scrape endpoint; the numbers are those of the serving process only
+
+    @staticmethod
+    def get(req):
+        if not _isAllowed(req):
+            return HttpResponseForbidden("Metrics are for staff and scrapers")
+        return HttpResponse(registry.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
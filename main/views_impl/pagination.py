@@ -0,0 +1,71 @@
+import datetime
+
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+@dataclass
+class KeysetPage:
+    rows: List
+    size: int
+    newerCursor: Optional[str]
+    olderCursor: Optional[str]
+
+
+def _encodeCursor(row) -> str:
+    return f'{(row.timestamp - EPOCH) // datetime.timedelta(microseconds=1)}_{row.pk}'
+
+
+def _decodeCursor(cursor: Optional[str]) -> Optional[Tuple[datetime.datetime, int]]:
+    if not cursor:
+        return None
+    try:
+        micros, pk = map(int, cursor.split('_'))
+        if not 0 <= pk < 1 << 63:
+            return None  # No such id, and too large for the database to compare with
+        return EPOCH + datetime.timedelta(microseconds=micros), pk
+    except (ValueError, OverflowError):
+        return None
+
+
+def _pageSize(req) -> int:
+    try:
+        size = int(req.GET.get('size', settings.LIST_PAGE_SIZE))
+    except ValueError:
+        size = settings.LIST_PAGE_SIZE
+    return max(1, min(size, settings.LIST_MAX_PAGE_SIZE))
+
+
+def keysetPage(queryset, req) -> KeysetPage:
+    # Newest first by (timestamp, id), a page starts right after (?after=) or before (?before=) a cursor.
+    # Unlike offsets, a cursor costs a single index seek however deep it is, and stays valid as rows are added.
+    size = _pageSize(req)
+    before = _decodeCursor(req.GET.get('before'))
+    after = _decodeCursor(req.GET.get('after'))
+
+    if before is not None:
+        timestamp, pk = before
+        rows = list(queryset.filter(
+            Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, pk__gt=pk)
+        ).order_by('timestamp', 'pk')[:size + 1])
+        hasNewer, hasOlder = len(rows) > size, True
+        rows = rows[:size][::-1]
+    else:
+        if after is not None:
+            timestamp, pk = after
+            queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, pk__lt=pk))
+        rows = list(queryset.order_by('-timestamp', '-pk')[:size + 1])
+        hasNewer, hasOlder = after is not None, len(rows) > size
+        rows = rows[:size]
+
+    return KeysetPage(
+        rows=rows,
+        size=size,
+        newerCursor=_encodeCursor(rows[0]) if hasNewer and rows else None,
+        olderCursor=_encodeCursor(rows[-1]) if hasOlder and rows else None,
+    )
@@ -1,30 +1,40 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied, BadRequest
-from django.shortcuts import get_object_or_404, render, redirect
+from django.http import HttpResponse
+from django.shortcuts import render, redirect
 from django.urls import reverse
 from django.utils.decorators import method_decorator
 from django.views import View
 
-from main.models_impl import ExecStatus, Run, OverallRunStatus, Submission
-from main.tools.exec_api import execApi
+from main.models_impl import ExecJob, ExecStatus, Run, RunBatch, OverallRunStatus, Submission, LISTED_FIELDS
+from .artifacts import artifactPreview
+from .common import alogin_required, aget_object_or_404, arefresh, orUnavailable
+from .pagination import keysetPage
 
 
 class RunView(View):
-    @method_decorator(login_required(login_url="login"))
-    def get(self, req, id: int):
-        run = get_object_or_404(Run, pk=id)
-        run.tryUpdate()
-        if run.submission.user != req.user and not req.user.is_staff:
+    @alogin_required(login_url="login")
+    async def get(self, req, id: int):
+        run = await aget_object_or_404(Run.objects.select_related('submission', 'runResult'), pk=id)
+        if run.submission.user_id != req.user.pk and not req.user.is_staff:
             raise PermissionDenied("Not your run")
+        stale = not await arefresh(run)
 
         stdout = stderr = result = None
         if run.execStatus == ExecStatus.FINISHED:
-            stdout = execApi.getArtifact(run.runResult.stdoutId)
-            stderr = execApi.getArtifact(run.runResult.stderrId)
+            stdout, stderr = await asyncio.gather(
+                orUnavailable(artifactPreview(run.runResult.stdoutId)),
+                orUnavailable(artifactPreview(run.runResult.stderrId)),
+            )
             result = run.runResult
 
-        return render(req, 'main/run.html', {
+        return await sync_to_async(render)(req, 'main/run.html', {
             'run': run,
+            'stale': stale,
             'stdout': stdout,
             'stderr': stderr,
             'runResult': result,
@@ -34,26 +44,78 @@ class RunView(View):
 class RunsView(View):
     @method_decorator(login_required(login_url="login"))
     def get(self, req):
-        Run.tryUpdateAll()
-        runs = Run.objects.filter(submission__user=req.user).order_by("-timestamp")
+        page = keysetPage(Run.objects.filter(submission__user=req.user).only(*LISTED_FIELDS), req)
         return render(req, 'main/runs.html', {
-            'runs': runs,
+            'runs': page.rows,
+            'page': page,
+        })
+
+
+class RunBatchView(View):
+    @alogin_required(login_url="login")
+    async def get(self, req, id: int):
+        batch = await aget_object_or_404(RunBatch.objects.select_related('submission'), pk=id)
+        if batch.submission.user_id != req.user.pk and not req.user.is_staff:
+            raise PermissionDenied("Not your runs")
+        verdicts = await sync_to_async(batch.verdicts)()
+        page = await sync_to_async(keysetPage)(batch.run_set.only(*LISTED_FIELDS, 'batch'), req)
+        return await sync_to_async(render)(req, 'main/run_batch.html', {
+            'batch': batch,
+            'verdicts': sorted(verdicts.items()),
+            'total': sum(verdicts.values()),
+            'passed': verdicts.get(OverallRunStatus.OK, 0),
+            'runs': page.rows,
+            'page': page,
         })
 
 
+async def _getRunnableSubmission(req, id: int) -> Submission:
+    subm = await aget_object_or_404(Submission.objects.select_related('compilationResult'), pk=id)
+    if subm.user_id != req.user.pk and not req.user.is_staff:
+        raise PermissionDenied("Not your submission")
+    await arefresh(subm)
+    if subm.overallStatus != OverallRunStatus.OK:
+        raise BadRequest("The submission has not yet compiled, or compilation has failed")
+    return subm
+
+
 class CreateRunView(View):
-    @method_decorator(login_required(login_url="login"))
-    def post(self, req, id: int):
-        subm = get_object_or_404(Submission, pk=id)
-        if subm.user != req.user and not req.user.is_staff:
-            raise PermissionDenied("Not your submission")
-        subm.tryUpdate()
-        if subm.overallStatus() != OverallRunStatus.OK:
-            raise BadRequest("The submission has not yet compiled, or compilation has failed")
-        runId = execApi.run(subm.compilationResult.binaryId)
-        run = Run(
-            execId=runId,
-            submission=subm,
+    @alogin_required(login_url="login")
+    async def post(self, req, id: int):
+        subm = await _getRunnableSubmission(req, id)
+        binaryId = subm.compilationResult.binaryId
+        run = Run(submission=subm, memoKey=Run.memoKeyFor(binaryId, None))
+        # Benchmarks are about the timings, so they always execute
+        if not req.POST.get('benchmark') and await sync_to_async(run.reuseMemoized)():
+            return redirect(reverse('run', args=(run.pk,)))
+
+        if await sync_to_async(ExecJob.isOverloaded)():
+            return HttpResponse("Too many runs are waiting, please try again in a minute", status=503)
+        await sync_to_async(ExecJob.enqueueRun)(run, binaryId)
+        return redirect(reverse('run', args=(run.pk,)))
+
+
+class CreateRunBatchView(View):
+    @alogin_required(login_url="login")
+    async def post(self, req, id: int):
+        subm = await _getRunnableSubmission(req, id)
+        inputs = req.FILES.getlist('inputs')
+        if not inputs:
+            raise BadRequest("Please, select input files")
+        if len(inputs) > settings.EXEC_RUN_BATCH_MAX_INPUTS:
+            raise BadRequest(f"No more than {settings.EXEC_RUN_BATCH_MAX_INPUTS} inputs at once")
+        if any(f.size > settings.EXEC_RUN_MAX_INPUT_BYTES for f in inputs):
+            raise BadRequest(f"An input should not exceed {settings.EXEC_RUN_MAX_INPUT_BYTES} bytes")
+        if sum(f.size for f in inputs) > settings.EXEC_RUN_BATCH_MAX_BYTES:
+            raise BadRequest(f"The inputs should not exceed {settings.EXEC_RUN_BATCH_MAX_BYTES} bytes in total")
+        if await sync_to_async(ExecJob.isOverloaded)(len(inputs)):
+            return HttpResponse("Too many runs are waiting, please try again in a minute", status=503)
+
+        batch = RunBatch(submission=subm)
+        await sync_to_async(ExecJob.enqueueRunBatch)(
+            batch,
+            subm.compilationResult.binaryId,
+            inputs,
+            memoize=not req.POST.get('benchmark'),
         )
-        run.save()
-        return redirect(reverse('run', args=(run.pk,)))
\ No newline at end of file
+        return redirect(reverse('run-batch', args=(batch.pk,)))
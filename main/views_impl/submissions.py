@@ -1,33 +1,39 @@
-from django.contrib.auth.decorators import login_required
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
 from django.core.exceptions import PermissionDenied
-from django.shortcuts import render, redirect, get_object_or_404
-from django.utils.decorators import method_decorator
+from django.shortcuts import render, redirect
 from django.views import View
 
-from main.models_impl import ExecStatus, Submission
-from main.tools.exec_api import execApi
+from main.models_impl import ExecJob, ExecStatus, Submission, LISTED_FIELDS, importSubmissions
+from main.tools.archives import iterArchive
+from main.tools.exec_api import asyncExecApi
+from .artifacts import artifactPreview
+from .common import alogin_required, aget_object_or_404, arefresh, orUnavailable
+from .pagination import keysetPage
 
 
 class SubmissionsView(View):
-    @staticmethod
-    @login_required(login_url='login')
-    def get(req, err=None):
-        Submission.tryUpdateAll()
-        submissions = req.user.submission_set.order_by("-timestamp")
-        return render(req, "main/submissions.html", {
-            "submissions": submissions,
+    @alogin_required(login_url='login')
+    async def get(self, req, err=None):
+        page = await sync_to_async(keysetPage)(req.user.submission_set.only(*LISTED_FIELDS, 'user'), req)
+        return await sync_to_async(render)(req, "main/submissions.html", {
+            "submissions": page.rows,
+            "page": page,
             "error_msg": err,
         })
 
-    @method_decorator(login_required(login_url='login'))
-    def post(self, req):
+    @alogin_required(login_url='login')
+    async def post(self, req):
         try:
             source = req.FILES["source"]
         except KeyError:
-            return self.get(req, err="Please, select file")
+            return await self.get(req, err="Please, select file")
 
-        if len(source) > (64 << 10):
-            return self.get(req, err="Your source should not exceed 64KB")
+        if len(source) > settings.EXEC_SOURCE_MAX_BYTES:
+            return await self.get(req, err=f"Your source should not exceed {settings.EXEC_SOURCE_MAX_BYTES >> 10}KB")
 
         # user_submissions = Submission.objects.filter(user=req.user).order_by("-timestamp")
         # if not req.user.is_staff and \
@@ -36,30 +42,67 @@ class SubmissionsView(View):
         #     return self.get(req, err="You are not allowed to submit more than once in 10 seconds")
 
         s = b''.join(c for c in source.chunks())
-        inf = execApi.submit(s)
-        subm = Submission(
-            execId=inf.id,
-            sourceId=inf.srcId,
-            user=req.user,
-        )
-        subm.save()
+        subm = Submission(user=req.user, sourceHash=Submission.hashSource(s))
+        if await sync_to_async(subm.reuseCompilation)():
+            return redirect("submissions")
+
+        if await sync_to_async(ExecJob.isOverloaded)():
+            resp = await self.get(req, err="Too many submissions are waiting, please try again in a minute")
+            resp.status_code = 503
+            return resp
+
+        await sync_to_async(ExecJob.enqueueSubmission)(subm, s)
+        return redirect("submissions")
+
+
+class ImportSubmissionsView(View):
+    @alogin_required(login_url='login')
+    async def post(self, req):
+        try:
+            archive = req.FILES['archive']
+        except KeyError:
+            await sync_to_async(messages.error)(req, "Please, select an archive")
+            return redirect("submissions")
+
+        entries = iterArchive(archive, settings.EXEC_SOURCE_MAX_BYTES, settings.EXEC_IMPORT_MAX_ENTRIES)
+        report = await sync_to_async(importSubmissions)(req.user, entries)
+
+        summary = f"Imported {report.imported} submissions"
+        if report.reused:
+            summary += f", {report.reused} of them already compiled"
+        if report.rejected:
+            summary += f"; skipped {len(report.rejected)} files: " + ", ".join(
+                f"{name} ({error})" for name, error in report.rejected[:10]
+            ) + (", ..." if len(report.rejected) > 10 else "")
+        if report.stopped:
+            summary += f"; the rest was not imported, {report.stopped}"
+        level = messages.WARNING if report.rejected or report.stopped else messages.SUCCESS
+        await sync_to_async(messages.add_message)(req, level, summary)
         return redirect("submissions")
 
 
 class SubmissionView(View):
-    @staticmethod
-    @login_required(login_url='login')
-    def get(req, id: int):
-        subm = get_object_or_404(Submission, pk=id)
-        if not req.user.is_staff and subm.user != req.user:
+    @alogin_required(login_url='login')
+    async def get(self, req, id: int):
+        subm = await aget_object_or_404(Submission.objects.select_related('compilationResult'), pk=id)
+        if not req.user.is_staff and subm.user_id != req.user.pk:
             raise PermissionDenied("Not your submission")
-        logs = runs = None
+        stale = not await arefresh(subm)
+        source = logs = page = None
         if subm.execStatus == ExecStatus.FINISHED:
-            logs = execApi.getArtifact(subm.compilationResult.errorLog)
-            runs = subm.run_set.order_by("-timestamp")
-        return render(req, 'main/submission.html', {
-            'source': execApi.getArtifact(subm.sourceId),
+            source, logs = await asyncio.gather(
+                orUnavailable(asyncExecApi.getArtifact(subm.sourceId)),
+                orUnavailable(artifactPreview(subm.compilationResult.errorLog)),
+            )
+            page = await sync_to_async(keysetPage)(subm.run_set.only(*LISTED_FIELDS, 'submission'), req)
+        elif subm.sourceId:
+            # Not there until the submission reaches exec
+            source = await orUnavailable(asyncExecApi.getArtifact(subm.sourceId))
+        return await sync_to_async(render)(req, 'main/submission.html', {
+            'source': source,
+            'stale': stale,
             'subm': subm,
-            'runs': runs,
+            'runs': page and page.rows,
+            'page': page,
             'logs': logs,
         })
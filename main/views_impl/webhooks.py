@@ -0,0 +1,46 @@
+import hashlib
+import hmac
+import json
+
+from django.conf import settings
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from main.models_impl import Run, Submission
+from main.tools import exec_api as execApi
+
+
+def _isAuthentic(req) -> bool:
+    token = req.headers.get('X-Exec-Token') or req.GET.get('token')
+    if token and hmac.compare_digest(token, settings.EXEC_API_TOKEN):
+        return True
+    signature = req.headers.get('X-Exec-Signature', '')
+    if settings.EXEC_WEBHOOK_SECRET and signature.startswith('sha256='):
+        expected = hmac.new(settings.EXEC_WEBHOOK_SECRET.encode(), req.body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(signature[len('sha256='):], expected)
+    return False
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ExecCallbackView(View):
+    # Exec calls this when a compilation or a run finishes, the body is the same json as its status endpoints
+    # plus "type" ("compile" or "run") and "id"
+
+    @staticmethod
+    def post(req):
+        if not _isAuthentic(req):
+            return HttpResponseForbidden("Bad token or signature")
+        try:
+            payload = json.loads(req.body)
+            kind, id = payload['type'], payload['id']
+            if kind == 'compile':
+                updated = Submission.updateByExecId(id, execApi.CompilationStatus.FromExec(payload))
+            elif kind == 'run':
+                updated = Run.updateByExecId(id, execApi.RunStatus.FromExec(payload))
+            else:
+                return HttpResponseBadRequest(f"Unknown type: {kind}")
+        except (ValueError, KeyError, TypeError) as e:
+            return HttpResponseBadRequest(f"Malformed callback: {e}")
+        return JsonResponse({'updated': updated})